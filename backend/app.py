@@ -1,33 +1,139 @@
-from flask import Flask, request, jsonify, Response, send_file
+import eventlet
+eventlet.monkey_patch()
+from eventlet import tpool
+
+from flask import Flask, request, jsonify, Response, send_file, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import cv2
+import numpy as np
 import threading
 import base64
 import json
+import collections
+import mimetypes
+import queue
+import orjson
+from bson.objectid import ObjectId
+from cachetools import TTLCache, cached
 from datetime import datetime
 import time
 
-import sys, os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from models.score import ProctoringScoreSystem
-from database.db import ProctoringDatabase
+import os
+from backend.models.score import ProctoringScoreSystem
+from backend.database.db import ProctoringDatabase, stamp_times, to_object_id
+
+# libjpeg-turbo decoder (SIMD); falls back to cv2.imdecode when the library is absent
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _tj = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    _tj = None
+
+# orjson for REST responses and socket.io packets; ObjectIds serialize as plain strings
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+def _json_default(obj):
+    """Serialize types orjson does not handle natively"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class OrjsonProvider(JSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_json_default, option=ORJSON_OPTIONS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_json_default, option=ORJSON_OPTIONS)
+        return self._app.response_class(body, mimetype='application/json')
+
+class _OrjsonSocketShim:
+    """Stand-in for the json module with the dumps/loads signatures python-socketio calls"""
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj, default=_json_default, option=ORJSON_OPTIONS).decode('utf-8')
+    
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app, resources={r"/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', ping_timeout=60, ping_interval=25)
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', ping_timeout=60, ping_interval=25,
+                    json=_OrjsonSocketShim)
 
-# Store active sessions
+# Store active sessions (keyed by "user_exam") and an index by session ID
 active_sessions = {}
+sessions_by_id = {}
+sessions_lock = threading.Lock()
 db = ProctoringDatabase()
 
+# Raw frame uploads are read from the request stream in chunks of this size
+FRAME_READ_CHUNK = 64 * 1024
+VIDEO_STREAM_CHUNK = 64 * 1024
+
+# Latest monitoring_update payload per session room, flushed by a background ticker
+pending_updates = {}
+UPDATE_EMIT_INTERVAL = 0.1
+_ticker_lock = threading.Lock()
+_ticker_started = False
+
+# Short-lived caches for dashboard endpoints that get polled every few seconds
+dashboard_cache = TTLCache(maxsize=16, ttl=2)
+active_sessions_cache = TTLCache(maxsize=4, ttl=0.25)
+cache_lock = threading.Lock()
+
+class FramePool:
+    def __init__(self, size=4):
+        """
+        Recycle upload buffers so frames do not allocate a fresh bytearray each time
+        
+        Args:
+            size: Maximum number of idle buffers kept around
+        """
+        self._buffers = collections.deque(maxlen=size)
+    
+    def acquire(self, length):
+        """Get a buffer of at least `length` bytes"""
+        try:
+            buf = self._buffers.pop()
+        except IndexError:
+            buf = bytearray(length)
+        if len(buf) < length:
+            # Never resize a recycled buffer in place: a stray memoryview export would raise BufferError
+            buf = bytearray(length)
+        return buf
+    
+    def release(self, buf):
+        """Return a buffer to the pool"""
+        self._buffers.append(buf)
+
 class SessionMonitor:
     def __init__(self, user_id, exam_id):
         self.user_id = user_id
         self.exam_id = exam_id
-        self.scorer = ProctoringScoreSystem()
+        # Sessions share the app's database: one connection pool and one violation batcher
+        self.scorer = ProctoringScoreSystem(db=db)
         self.is_running = False
         self.session_id = None
+        self.process_frame = None
+        self.frame_pool = FramePool()
+        
+        # Pending frames; a small queue so stale frames are dropped when inference falls behind
+        self.frame_queue = queue.Queue(maxsize=2)
+        self.worker_lock = threading.Lock()
+        self.worker_active = False
+        self.processing_lock = threading.Lock()
+        
+        # Time-gated sampling: frames arriving within sample_period of the last analyzed one are skipped
+        self.next_process_ts = 0.0
+        self.sample_period = 0.15
         
     def start(self):
         """Start monitoring session (web-based, frames come from client)"""
@@ -42,11 +148,84 @@ class SessionMonitor:
         self.scorer.session_id = self.session_id
         self.scorer._start_new_interval()
         self.scorer.screen_monitor.start_monitoring()
+        self.process_frame = _make_frame_processor(self)
+        
+    def should_sample(self):
+        """Return True if enough time passed since the last analyzed frame"""
+        now = time.monotonic()
+        if now < self.next_process_ts:
+            return False
+        self.next_process_ts = now + self.sample_period
+        return True
+    
+    def update_screen_activity(self, screen_activity):
+        """Copy the client's tab switch / copy-paste counters onto the screen monitor"""
+        if screen_activity:
+            self.scorer.screen_monitor.tab_switches = screen_activity.get('tabSwitches', 0)
+            self.scorer.screen_monitor.copy_paste_events = screen_activity.get('copyPasteEvents', 0)
+    
+    def submit_frame(self, buf, frame_bytes, screen_activity, recorded=False):
+        """
+        Queue a frame for background processing, dropping the oldest one if the queue is full
         
+        Args:
+            buf: Pooled buffer backing frame_bytes (None if not pooled)
+            frame_bytes: Encoded JPEG bytes
+            screen_activity: Dict with tabSwitches/copyPasteEvents counters
+            recorded: True if the JPEG was already muxed into the interval recording
+        """
+        item = (buf, frame_bytes, screen_activity, recorded)
+        while True:
+            try:
+                self.frame_queue.put_nowait(item)
+                break
+            except queue.Full:
+                try:
+                    stale = self.frame_queue.get_nowait()
+                except queue.Empty:
+                    continue
+                if stale[0] is not None:
+                    self.frame_pool.release(stale[0])
+        
+        # One background task per session at a time keeps the scorer single-threaded
+        with self.worker_lock:
+            if self.worker_active:
+                return
+            self.worker_active = True
+        socketio.start_background_task(self._drain_frames)
+    
+    def _drain_frames(self):
+        """Process queued frames one at a time until the queue is empty"""
+        process_frame = self.process_frame
+        while True:
+            try:
+                buf, frame_bytes, screen_activity, recorded = self.frame_queue.get_nowait()
+            except queue.Empty:
+                with self.worker_lock:
+                    if self.frame_queue.empty():
+                        self.worker_active = False
+                        return
+                continue
+            
+            try:
+                with self.processing_lock:
+                    if self.is_running:
+                        process_frame(frame_bytes, screen_activity, recorded)
+            finally:
+                if buf is not None:
+                    self.frame_pool.release(buf)
+            
+            # Yield to the reactor so sockets and other sessions are serviced between frames
+            socketio.sleep(0)
+    
     def stop(self):
         """Stop monitoring"""
         self.is_running = False
         
+        # Wait for a frame that is mid-analysis before closing the scorer
+        with self.processing_lock:
+            pass
+        
         # Generate final report
         report = self.scorer.generate_report()
         if self.session_id:
@@ -60,9 +239,283 @@ class SessionMonitor:
 def index():
     return "AI Proctoring Backend is running."
 
+def _find_monitor(session_id):
+    """Look up the active monitor for a session ID"""
+    return sessions_by_id.get(session_id)
+
+def _read_frame_body(pool):
+    """
+    Read the raw request body into a pooled buffer without caching it on the request
+    
+    Args:
+        pool: FramePool to take the buffer from
+        
+    Returns:
+        tuple: (buffer, memoryview over the bytes actually read)
+    """
+    length = request.content_length
+    if length is None:
+        # Chunked upload: size unknown up front, fall back to growing a fresh buffer
+        buf = bytearray()
+        while True:
+            chunk = request.stream.read(FRAME_READ_CHUNK)
+            if not chunk:
+                break
+            buf.extend(chunk)
+        return buf, memoryview(buf)
+    
+    buf = pool.acquire(length)
+    view = memoryview(buf)
+    read = 0
+    while read < length:
+        n = request.stream.readinto(view[read:length])
+        if not n:
+            break
+        read += n
+    return buf, view[:read]
+
+def _screen_activity_from_headers():
+    """Build the screen activity dict from the X-Tab-Switches / X-Copy-Paste-Events headers"""
+    tab_switches = request.headers.get('X-Tab-Switches', request.args.get('tabSwitches'))
+    copy_paste = request.headers.get('X-Copy-Paste-Events', request.args.get('copyPasteEvents'))
+    if tab_switches is None and copy_paste is None:
+        return {}
+    return {
+        'tabSwitches': int(tab_switches or 0),
+        'copyPasteEvents': int(copy_paste or 0)
+    }
+
+def _path_key(*args, **kwargs):
+    """Cache key for dashboard payloads: the request path"""
+    return request.path
+
+def _invalidate_dashboard(*paths):
+    """Drop cached dashboard payloads (all of them if no paths are given)"""
+    with cache_lock:
+        if not paths:
+            dashboard_cache.clear()
+            active_sessions_cache.clear()
+        for path in paths:
+            dashboard_cache.pop(path, None)
+            active_sessions_cache.pop(path, None)
+
+def _has_viewers(session_id):
+    """Check whether any socket.io client joined the session room"""
+    return bool(socketio.server.manager.rooms.get('/', {}).get(session_id))
+
+def _emit_pending_updates():
+    """Emit the latest payload of each session at most every UPDATE_EMIT_INTERVAL seconds"""
+    while True:
+        for session_id in list(pending_updates):
+            payload = pending_updates.pop(session_id, None)
+            if payload is not None:
+                socketio.emit('monitoring_update', payload, room=session_id)
+        socketio.sleep(UPDATE_EMIT_INTERVAL)
+
+def _finalize_recording(writer, path):
+    """Release a detached writer (flush + trailer) and delete its file (in-memory recordings are just dropped)"""
+    writer.release()
+    if isinstance(path, str) and os.path.exists(path):
+        os.remove(path)
+
+def _cleanup_worker():
+    """Finalize discarded interval recordings off the frame path"""
+    while True:
+        writer, path = cleanup_q.get()
+        try:
+            # Container finalization blocks on file I/O: run it on a native thread, not the reactor
+            tpool.execute(_finalize_recording, writer, path)
+        except Exception as e:
+            print(f"✗ Error discarding recording {path}: {e}")
+
+cleanup_q = queue.Queue()
+threading.Thread(target=_cleanup_worker, daemon=True).start()
+
+def _ensure_update_ticker():
+    """Start the emit ticker once"""
+    global _ticker_started
+    with _ticker_lock:
+        if not _ticker_started:
+            socketio.start_background_task(_emit_pending_updates)
+            _ticker_started = True
+
+def _queue_monitoring_update(monitor, session_id, frame_bytes, gaze_result, face_result, screen_activity):
+    """
+    Store the latest analysis result for the session room (last write wins)
+    
+    The JPEG travels as a socket.io binary attachment next to the JSON metadata,
+    so it is neither base64-encoded here nor decoded in the browser.
+    """
+    meta = {
+        'session_id': session_id,
+        'user_id': monitor.user_id,
+        'gaze': {
+            'status': 'focused' if gaze_result.get('focused') else 'distracted',
+            'horizontal_ratio': 0.5,
+            'vertical_ratio': 0.5
+        },
+        'faces': {
+            'count': face_result.get('num_faces', 0),
+            'has_multiple': face_result.get('multiple_faces', False)
+        },
+        'audio': {
+            'speech_detected': False,
+            'multiple_speakers': False
+        },
+        'screen': {
+            'tab_switches': screen_activity.get('tabSwitches', 0),
+            'copy_paste_events': screen_activity.get('copyPasteEvents', 0)
+        },
+        'interval_score': monitor.scorer.interval_score,
+        'total_score': monitor.scorer.total_score,
+        'violations': [stamp_times(dict(v)) for v in monitor.scorer.interval_violations],
+        'status': 'flagged' if monitor.scorer.interval_score >= monitor.scorer.FLAG_THRESHOLD else 'clear',
+        'timestamp': datetime.now().isoformat()
+    }
+    # Copy: frame_bytes may be a view into a pooled upload buffer that is recycled after this frame
+    pending_updates[session_id] = {'meta': meta, 'frame': bytes(frame_bytes)}
+
+def _decode_jpeg(frame_bytes):
+    """Decode JPEG bytes to a BGR frame, or None if the data is invalid"""
+    if _tj is not None:
+        try:
+            return _tj.decode(frame_bytes, pixel_format=TJPF_BGR)
+        except OSError:
+            return None
+    return cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+def _make_frame_processor(monitor):
+    """
+    Build the per-frame analysis function for a session
+    
+    The scorer, its bound methods and its constants are captured once as closure
+    variables, so the hot path skips the monitor.scorer.* attribute chains per frame.
+    
+    Args:
+        monitor: SessionMonitor the frames belong to
+        
+    Returns:
+        function(frame_bytes, screen_activity, recorded=False) -> bool
+    """
+    scorer = monitor.scorer
+    session_id = str(monitor.session_id)
+    detect_focus = scorer.gaze_detector.detect_focus
+    score_combined = scorer.score_combined
+    record_frame = scorer.record_frame
+    interval_duration = scorer.INTERVAL_DURATION
+    flag_threshold = scorer.FLAG_THRESHOLD
+    decode = _decode_jpeg
+    shrink = scorer.detection_frame
+    has_viewers = _has_viewers
+    queue_update = _queue_monitoring_update
+    clock = time.time
+    execute = tpool.execute
+    
+    def detect(frame_bytes):
+        """Decode and run FaceMesh on a downscaled copy (no green primitives: runs on a native thread)"""
+        frame = decode(frame_bytes)
+        if frame is None:
+            return None, None
+        return frame, detect_focus(shrink(frame))
+    
+    def process_frame(frame_bytes, screen_activity, recorded=False):
+        """
+        Decode a JPEG frame, run AI analysis and broadcast the result
+        
+        Args:
+            frame_bytes: Encoded JPEG bytes (bytes, bytearray or memoryview)
+            screen_activity: Dict with tabSwitches/copyPasteEvents counters
+            recorded: True if the JPEG was already muxed into the interval recording
+            
+        Returns:
+            True if the frame was analyzed
+        """
+        try:
+            # Decode and inference are CPU-bound: run them on a native thread so the hub keeps
+            # serving sockets and other sessions. Everything below touches green locks and queues
+            # (video_lock, the flag writer, cleanup_q, the DB flusher) and stays on the hub.
+            frame, result = execute(detect, frame_bytes)
+            
+            if frame is None:
+                print(f"Invalid frame data for session {session_id}")
+                return False
+            
+            flags_before = len(scorer.flags)
+            gaze_result, face_result = score_combined(result)
+            
+            # Without JPEG passthrough, record the decoded frame instead
+            if not recorded:
+                record_frame(frame)
+            
+            # Queue real-time update, reusing the client's JPEG instead of re-encoding
+            if has_viewers(session_id):
+                queue_update(monitor, session_id, frame_bytes, gaze_result, face_result, screen_activity)
+            
+            # Check interval completion
+            if clock() - scorer.interval_start_time >= interval_duration:
+                if scorer.interval_score < flag_threshold:
+                    writer, path = scorer._detach_video_recording()
+                    if writer is not None:
+                        cleanup_q.put((writer, path))
+                scorer._start_new_interval()
+            
+            # A new flagged interval was saved: refresh the dashboard counters
+            if len(scorer.flags) != flags_before:
+                _invalidate_dashboard('/api/sessions/stats', '/api/flagged/all')
+            
+            return True
+            
+        except Exception as e:
+            print(f"Error processing frame: {e}")
+            return False
+    
+    return process_frame
+
+def _frame_skipped():
+    """Response for frames dropped by the sampler"""
+    return jsonify({'success': True, 'skipped': True})
+
+def _frame_accepted(monitor):
+    """202 response carrying the last computed scores while the frame is processed"""
+    return jsonify({
+        'success': True,
+        'queued': True,
+        'interval_score': monitor.scorer.interval_score,
+        'total_score': monitor.scorer.total_score
+    }), 202
+
+@app.route('/api/session/<session_id>/frame_raw', methods=['POST'])
+def receive_frame_raw(session_id):
+    """Receive a raw JPEG frame (Content-Type: image/jpeg) from client browser"""
+    monitor = _find_monitor(session_id)
+    
+    if not monitor:
+        return jsonify({'error': 'Session not found'}), 200
+    if not monitor.is_running:
+        return jsonify({'success': True, 'message': 'Session ending'}), 201
+    
+    try:
+        screen_activity = _screen_activity_from_headers()
+    except ValueError:
+        return jsonify({'error': 'Invalid screen activity headers'}), 400
+    
+    buf, frame_bytes = _read_frame_body(monitor.frame_pool)
+    if not frame_bytes:
+        monitor.frame_pool.release(buf)
+        return jsonify({'error': 'Missing frame data'}), 400
+    
+    monitor.update_screen_activity(screen_activity)
+    recorded = monitor.scorer.record_jpeg(frame_bytes)
+    if not monitor.should_sample():
+        monitor.frame_pool.release(buf)
+        return _frame_skipped()
+    
+    monitor.submit_frame(buf, frame_bytes, screen_activity, recorded=recorded)
+    return _frame_accepted(monitor)
+
 @app.route('/api/session/<session_id>/frame', methods=['POST'])
 def receive_frame(session_id):
-    """Receive frame from client browser"""
+    """Receive base64 frame from client browser (legacy JSON upload)"""
     data = request.json
     frame_base64 = data.get('frame')
     screen_activity = data.get('screen_activity', {})
@@ -70,12 +523,7 @@ def receive_frame(session_id):
     if not frame_base64:
         return jsonify({'error': 'Missing frame data'}), 400
     
-    # Find active session
-    monitor = None
-    for key, mon in active_sessions.items():
-        if str(mon.session_id) == session_id:
-            monitor = mon
-            break
+    monitor = _find_monitor(session_id)
     
     if not monitor:
         return jsonify({'error': 'Session not found'}), 200
@@ -83,82 +531,18 @@ def receive_frame(session_id):
         return jsonify({'success': True, 'message': 'Session ending'}), 201
     
     try:
-        import numpy as np
-        # Decode base64 frame
-        frame_data = base64.b64decode(frame_base64.split(',')[1] if ',' in frame_base64 else frame_base64)
-        nparr = np.frombuffer(frame_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if frame is None:
-            return jsonify({'error': 'Invalid frame data'}), 400
-        
-        # Run AI analysis
-        gaze_result = monitor.scorer.analyze_gaze(frame)
-        face_result = monitor.scorer.analyze_faces(frame)
-        
-        # Update screen activity scores
-        if screen_activity:
-            monitor.scorer.screen_monitor.tab_switches = screen_activity.get('tabSwitches', 0)
-            monitor.scorer.screen_monitor.copy_paste_events = screen_activity.get('copyPasteEvents', 0)
-        
-        # Write frame to video if recording
-        if monitor.scorer.video_writer:
-            monitor.scorer.video_writer.write(frame)
-        elif not monitor.scorer.is_recording:
-            h, w = frame.shape[:2]
-            monitor.scorer._start_video_recording(w, h)
-        
-        # Encode frame for streaming
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame_encoded = base64.b64encode(buffer).decode('utf-8')
-        
-        # Emit real-time update
-        socketio.emit('monitoring_update', {
-            'session_id': session_id,
-            'user_id': monitor.user_id,
-            'frame': f'data:image/jpeg;base64,{frame_encoded}',
-            'gaze': {
-                'status': 'focused' if gaze_result.get('focused') else 'distracted',
-                'horizontal_ratio': 0.5,
-                'vertical_ratio': 0.5
-            },
-            'faces': {
-                'count': face_result.get('num_faces', 0),
-                'has_multiple': face_result.get('multiple_faces', False)
-            },
-            'audio': {
-                'speech_detected': False,
-                'multiple_speakers': False
-            },
-            'screen': {
-                'tab_switches': screen_activity.get('tabSwitches', 0),
-                'copy_paste_events': screen_activity.get('copyPasteEvents', 0)
-            },
-            'interval_score': monitor.scorer.interval_score,
-            'total_score': monitor.scorer.total_score,
-            'violations': monitor.scorer.interval_violations,
-            'status': 'flagged' if monitor.scorer.interval_score >= monitor.scorer.FLAG_THRESHOLD else 'clear',
-            'timestamp': datetime.now().isoformat()
-        }, room=session_id)
-        
-        # Check interval completion
-        elapsed = time.time() - monitor.scorer.interval_start_time
-        if elapsed >= monitor.scorer.INTERVAL_DURATION:
-            if monitor.scorer.interval_score < monitor.scorer.FLAG_THRESHOLD:
-                video_file = monitor.scorer._stop_video_recording()
-                if video_file and os.path.exists(video_file):
-                    os.remove(video_file)
-            monitor.scorer._start_new_interval()
-        
-        return jsonify({
-            'success': True,
-            'interval_score': monitor.scorer.interval_score,
-            'total_score': monitor.scorer.total_score
-        })
-        
-    except Exception as e:
-        print(f"Error processing frame: {e}")
-        return jsonify({'error': str(e)}), 500
+        frame_bytes = base64.b64decode(frame_base64.split(',')[1] if ',' in frame_base64 else frame_base64)
+    except ValueError:
+        return jsonify({'error': 'Invalid frame data'}), 400
+    
+    monitor.update_screen_activity(screen_activity)
+    recorded = monitor.scorer.record_jpeg(frame_bytes)
+    if not monitor.should_sample():
+        return _frame_skipped()
+    
+    monitor.submit_frame(None, frame_bytes, screen_activity, recorded=recorded)
+    return _frame_accepted(monitor)
+
 @app.route('/api/session/create', methods=['POST'])
 def create_session():
     """Create a new monitoring session"""
@@ -172,10 +556,17 @@ def create_session():
     # Create session monitor
     monitor = SessionMonitor(user_id, exam_id)
     monitor.start()
+    _ensure_update_ticker()
     
     # Store in active sessions
     session_key = f"{user_id}_{exam_id}"
-    active_sessions[session_key] = monitor
+    with sessions_lock:
+        previous = active_sessions.get(session_key)
+        if previous:
+            sessions_by_id.pop(str(previous.session_id), None)
+        active_sessions[session_key] = monitor
+        sessions_by_id[str(monitor.session_id)] = monitor
+    _invalidate_dashboard()
     
     return jsonify({
         'success': True,
@@ -194,30 +585,17 @@ def end_session():
     
     session_key = f"{user_id}_{exam_id}"
     
-    if session_key not in active_sessions:
+    with sessions_lock:
+        monitor = active_sessions.get(session_key)
+    if not monitor:
         return jsonify({'error': 'Session not found'}), 404
     
-    monitor = active_sessions[session_key]
-    
     try:
         report = monitor.stop()
-        del active_sessions[session_key]
-        
-        # Convert ObjectId to string in report
-        if '_id' in report:
-            report['_id'] = str(report['_id'])
-        if 'session_id' in report:
-            report['session_id'] = str(report['session_id'])
-        
-        # Convert ObjectId in flagged intervals
-        if 'flagged_intervals' in report:
-            for interval in report['flagged_intervals']:
-                if '_id' in interval:
-                    interval['_id'] = str(interval['_id'])
-                if 'session_id' in interval:
-                    interval['session_id'] = str(interval['session_id'])
-                if 'video_id' in interval:
-                    interval['video_id'] = str(interval['video_id'])
+        with sessions_lock:
+            active_sessions.pop(session_key, None)
+            sessions_by_id.pop(str(monitor.session_id), None)
+        _invalidate_dashboard()
         
         return jsonify({
             'success': True,
@@ -229,40 +607,40 @@ def end_session():
 @app.route('/api/sessions/active', methods=['GET'])
 def get_active_sessions():
     """Get all active sessions"""
-    sessions = []
-    for key, monitor in active_sessions.items():
-        sessions.append({
-            'user_id': monitor.user_id,
-            'exam_id': monitor.exam_id,
-            'session_id': str(monitor.session_id),
-            'interval_score': monitor.scorer.interval_score,
-            'total_score': monitor.scorer.total_score,
-            'is_running': monitor.is_running
-        })
-    
-    return jsonify(sessions)
+    return jsonify(_active_sessions_payload())
+
+@cached(active_sessions_cache, key=_path_key, lock=cache_lock)
+def _active_sessions_payload():
+    with sessions_lock:
+        monitors = list(sessions_by_id.items())
+    return [{
+        'user_id': monitor.user_id,
+        'exam_id': monitor.exam_id,
+        'session_id': session_id,
+        'interval_score': monitor.scorer.interval_score,
+        'total_score': monitor.scorer.total_score,
+        'is_running': monitor.is_running
+    } for session_id, monitor in monitors]
 
 @app.route('/api/sessions/stats', methods=['GET'])
 def get_session_stats():
     """Get overall statistics"""
-    all_sessions = list(db.sessions.find())
-    flagged_intervals = list(db.flagged_intervals.find())
-    
-    stats = {
-        'total_sessions': len(all_sessions),
+    return jsonify(_session_stats_payload())
+
+@cached(dashboard_cache, key=_path_key, lock=cache_lock)
+def _session_stats_payload():
+    return {
+        'total_sessions': db.sessions.estimated_document_count(),
         'active_sessions': len(active_sessions),
-        'flagged_intervals': len(flagged_intervals),
-        'high_risk': len([f for f in flagged_intervals if f.get('score', 0) > 20])
+        'flagged_intervals': db.flagged_intervals.estimated_document_count(),
+        'high_risk': db.flagged_intervals.count_documents({'score': {'$gt': 20}})
     }
-    
-    return jsonify(stats)
+
 @app.route('/api/session/<session_id>/details', methods=['GET'])
 def get_session_details(session_id):
     """Get details of a specific session with ALL violations and flagged intervals"""
-    from bson.objectid import ObjectId
-    
     try:
-        session = db.sessions.find_one({'_id': ObjectId(session_id)})
+        session = db.sessions.find_one({'_id': to_object_id(session_id)})
         if not session:
             return jsonify({'error': 'Session not found'}), 404
         
@@ -272,14 +650,11 @@ def get_session_details(session_id):
         # Get flagged intervals with video paths
         flagged = db.get_session_flagged_intervals(session_id)
         
-        # Convert ObjectId to string
-        session['_id'] = str(session['_id'])
-        
         # Format flagged intervals for frontend
         formatted_flagged = []
         for flag in flagged:
             formatted_flagged.append({
-                'interval_id': str(flag['_id']),
+                'interval_id': flag['_id'],
                 'start_time': flag.get('interval_start', ''),
                 'end_time': flag.get('interval_end', ''),
                 'score': flag.get('score', 0),
@@ -302,28 +677,94 @@ def get_session_details(session_id):
 @app.route('/api/flagged/all', methods=['GET'])
 def get_all_flagged():
     """Get all flagged intervals"""
+    return jsonify(_all_flagged_payload())
+
+@cached(dashboard_cache, key=_path_key, lock=cache_lock)
+def _all_flagged_payload():
     flagged = db.get_all_flagged_intervals(limit=100)
-    
-    # Convert ObjectId to string
-    for flag in flagged:
-        flag['_id'] = str(flag['_id'])
-        if 'video_id' in flag:
-            flag['video_id'] = str(flag['video_id'])
-    
-    return jsonify({'flagged_intervals': flagged, 'count': len(flagged)})
+    return {'flagged_intervals': flagged, 'count': len(flagged)}
 
 @app.route('/api/video/<video_id>', methods=['GET'])
 def get_video(video_id):
     """Stream video by ID"""
-    from bson.objectid import ObjectId
-    
     try:
-        video_data = db.get_video(ObjectId(video_id))
-        if video_data:
-            return Response(video_data, mimetype='video/mp4')
-        return jsonify({'error': 'Video not found'}), 404
+        video_file = db.get_video(to_object_id(video_id))
+        if not video_file:
+            return jsonify({'error': 'Video not found'}), 404
+        
+        total = video_file.length
+        mimetype = video_file.content_type or _video_mimetype(video_file.filename or '')
+        byte_range = _parse_range(request.headers.get('Range'), total)
+        
+        if byte_range is None:
+            response = Response(stream_with_context(_iter_video(video_file, total)), mimetype=mimetype)
+            response.headers['Content-Length'] = str(total)
+        elif byte_range is False:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{total}'
+            return response
+        else:
+            start, end = byte_range
+            video_file.seek(start)
+            response = Response(stream_with_context(_iter_video(video_file, end - start + 1)),
+                                status=206, mimetype=mimetype)
+            response.headers['Content-Range'] = f'bytes {start}-{end}/{total}'
+            response.headers['Content-Length'] = str(end - start + 1)
+        
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+def _iter_video(video_file, remaining, chunk_size=VIDEO_STREAM_CHUNK):
+    """Yield up to `remaining` bytes from a GridFS file in fixed-size chunks"""
+    try:
+        while remaining > 0:
+            chunk = video_file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        video_file.close()
+
+def _parse_range(header, total):
+    """
+    Parse a single-range `Range: bytes=start-end` header
+    
+    Args:
+        header: Range header value or None
+        total: Total file size in bytes
+        
+    Returns:
+        (start, end) inclusive, None to serve the whole file, False if unsatisfiable
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    
+    start_str, _, end_str = header[6:].strip().partition('-')
+    try:
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else total - 1
+        elif end_str:
+            # Suffix range: last N bytes
+            start = max(total - int(end_str), 0)
+            end = total - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    
+    end = min(end, total - 1)
+    if start >= total or start > end:
+        return False
+    return start, end
+
+def _video_mimetype(path):
+    """Guess the video MIME type (MJPEG recordings are .avi)"""
+    return mimetypes.guess_type(path)[0] or 'video/mp4'
+
 @app.route('/api/video/path', methods=['POST'])
 def get_video_by_path():
     """Get video from file system by path"""
@@ -350,7 +791,7 @@ def get_video_by_path():
         
         if os.path.exists(abs_path):
             print(f"✓ Serving video from: {abs_path}")
-            return send_file(abs_path, mimetype='video/mp4')
+            return send_file(abs_path, mimetype=_video_mimetype(abs_path))
         else:
             print(f"✗ File not found at: {abs_path}")
             return jsonify({'error': 'File not found'}), 404
@@ -362,7 +803,7 @@ def get_video_file(filepath):
     """Get video from file system"""
     try:
         if os.path.exists(filepath):
-            return send_file(filepath, mimetype='video/mp4')
+            return send_file(filepath, mimetype=_video_mimetype(filepath))
         return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -412,4 +853,4 @@ if __name__ == '__main__':
     print(f"💾 Database: MongoDB")
     print("="*60)
     
-    socketio.run(app, host='0.0.0.0', port=8000, debug=True, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    eventlet.wsgi.server(eventlet.listen(('0.0.0.0', 8000)), app)
\ No newline at end of file
@@ -1,7 +1,42 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, WriteConcern
 from gridfs import GridFS
+from bson.objectid import ObjectId
 from datetime import datetime
+from functools import lru_cache
 import os
+import shutil
+import threading
+
+@lru_cache(maxsize=1024)
+def to_object_id(value):
+    """
+    Parse a hex ID into an ObjectId, memoized for repeatedly looked-up sessions
+    
+    Args:
+        value: 24-char hex string or ObjectId
+        
+    Returns:
+        ObjectId
+    """
+    return value if isinstance(value, ObjectId) else ObjectId(value)
+
+def stamp_times(doc):
+    """
+    Format a document's integer '<name>_ns' times (recorded in the hot path, e.g. a violation's
+    'timestamp_ns' or a flag's 'flagged_at_ns') into the ISO-8601 '<name>' fields that are
+    stored and reported; already formatted ones are left as is
+    
+    Args:
+        doc: Violation or flagged-interval dictionary (updated in place)
+        
+    Returns:
+        The same dictionary
+    """
+    for key in [key for key in doc if key.endswith('_ns')]:
+        ns = doc.pop(key, None)
+        if ns is not None:
+            doc[key[:-3]] = datetime.fromtimestamp(ns / 1e9).isoformat()
+    return doc
 
 class ProctoringDatabase:
     def __init__(self, mongo_uri='mongodb://localhost:27017/', db_name='proctoring_db'):
@@ -12,16 +47,51 @@ class ProctoringDatabase:
             mongo_uri: MongoDB connection string
             db_name: Database name
         """
-        self.client = MongoClient(mongo_uri)
+        # Explicit pool cap, unjournaled w=1 acks and wire compression (missing compressors are skipped).
+        # No minPoolSize: sockets are opened on demand instead of held idle per client
+        self.client = MongoClient(
+            mongo_uri,
+            maxPoolSize=200,
+            socketTimeoutMS=5000,
+            retryWrites=True,
+            w=1,
+            journal=False,
+            compressors='zstd,snappy,zlib'
+        )
         self.db = self.client[db_name]
         self.fs = GridFS(self.db)
         
         # Collections
         self.flagged_intervals = self.db['flagged_intervals']
         self.sessions = self.db['sessions']
+        # Medium/high-severity violations are acknowledged; low-severity ones (the high-volume
+        # gaze events, re-derivable from the report) go through a fire-and-forget handle
         self.violations = self.db['violations']
+        self.low_violations = self.db.get_collection('violations', write_concern=WriteConcern(w=0))
         
         print(f"✓ Connected to MongoDB: {db_name}")
+        
+        self._create_indexes()
+        
+        # Violations are buffered and written in bulk, by batch size or by a background timer
+        self.violation_batch_size = 50
+        self.violation_flush_interval = 1.0
+        self._violation_buf = []
+        self._buf_lock = threading.Lock()
+        self._flush_stop = threading.Event()
+        self._flush_wake = threading.Event()
+        self._flusher = None
+    
+    def _create_indexes(self):
+        """Create the indexes backing per-session lookups, score filters and sorts (no-op if they exist)"""
+        try:
+            self.flagged_intervals.create_index([('session_id', 1)])
+            self.flagged_intervals.create_index([('score', -1)])
+            self.flagged_intervals.create_index([('saved_at', 1)])
+            self.sessions.create_index([('status', 1)])
+            self.violations.create_index([('session_id', 1), ('timestamp', -1)])
+        except Exception as e:
+            print(f"✗ Error creating indexes: {e}")
     
     def save_violation(self, violation_data):
         """
@@ -34,12 +104,72 @@ class ProctoringDatabase:
             Inserted document ID
         """
         try:
+            stamp_times(violation_data)
             violation_data['saved_at'] = datetime.now().isoformat()
             result = self.violations.insert_one(violation_data)
             return result.inserted_id
         except Exception as e:
             print(f"✗ Error saving violation: {e}")
             return None
+    
+    def enqueue_violation(self, violation_data):
+        """
+        Buffer a violation for a bulk insert (flushed at batch size or within flush interval);
+        the write always happens on the flusher thread, never in the caller
+        
+        Args:
+            violation_data: Dictionary with violation information including session_id
+        """
+        with self._buf_lock:
+            self._violation_buf.append(violation_data)
+            full = len(self._violation_buf) >= self.violation_batch_size
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flusher.start()
+        
+        if full:
+            self._flush_wake.set()
+    
+    def flush_violations(self):
+        """
+        Write all buffered violations with one unordered insert_many per write concern
+        (unacknowledged for low severity, acknowledged otherwise)
+        
+        Returns:
+            Number of violations written
+        """
+        with self._buf_lock:
+            batch = self._violation_buf
+            self._violation_buf = []
+        if not batch:
+            return 0
+        
+        # Timestamps are formatted here, once per batch, rather than by the caller
+        saved_at = datetime.now().isoformat()
+        for doc in batch:
+            stamp_times(doc)
+            doc['saved_at'] = saved_at
+        
+        low = [doc for doc in batch if doc.get('severity') == 'low']
+        acked = [doc for doc in batch if doc.get('severity') != 'low']
+        
+        written = 0
+        for collection, docs in ((self.low_violations, low), (self.violations, acked)):
+            if not docs:
+                continue
+            try:
+                collection.insert_many(docs, ordered=False)
+                written += len(docs)
+            except Exception as e:
+                print(f"✗ Error flushing {len(docs)} violations: {e}")
+        return written
+    
+    def _flush_loop(self):
+        """Background flusher: runs every flush interval, or as soon as a batch fills up"""
+        while not self._flush_stop.is_set():
+            self._flush_wake.wait(self.violation_flush_interval)
+            self._flush_wake.clear()
+            self.flush_violations()
 
     def get_session_violations(self, session_id):
         """
@@ -52,14 +182,8 @@ class ProctoringDatabase:
             List of violations sorted by timestamp
         """
         try:
-            violations = list(self.violations.find({'session_id': str(session_id)})
-                            .sort('timestamp', -1))  # Most recent first
-            
-            # Convert ObjectId to string
-            for v in violations:
-                v['_id'] = str(v['_id'])
-            
-            return violations
+            return list(self.violations.find({'session_id': str(session_id)})
+                        .sort('timestamp', -1))  # Most recent first
         except Exception as e:
             print(f"✗ Error retrieving session violations: {e}")
             return []
@@ -75,14 +199,8 @@ class ProctoringDatabase:
             List of flagged intervals with video paths
         """
         try:
-            intervals = list(self.flagged_intervals.find({'session_id': str(session_id)})
+            return list(self.flagged_intervals.find({'session_id': str(session_id)})
                         .sort('saved_at', -1))
-            
-            # Convert ObjectId to string
-            for interval in intervals:
-                interval['_id'] = str(interval['_id'])
-            
-            return intervals
         except Exception as e:
             print(f"✗ Error retrieving flagged intervals: {e}")
             return []
@@ -93,26 +211,35 @@ class ProctoringDatabase:
         
         Args:
             flag_data: Dictionary with interval information
-            video_file_path: Path to video file
+            video_file_path: Path to video file (moved), or an in-memory recording
+                (io.BytesIO with a name, written out once)
             folder_path: Base folder to save videos
             
         Returns:
             Inserted document ID
         """
         try:
+            stamp_times(flag_data)
+            
             # Create user folder: flagged_videos/user_123/
             user_id = flag_data.get('user_id', flag_data.get('session_id', 'unknown_user'))
             
             user_folder = os.path.join(folder_path, user_id)
             os.makedirs(user_folder, exist_ok=True)
             
-            # Generate permanent filename with timestamp and score
+            # Generate permanent filename with timestamp and score, keeping the recorder's container type
             timestamp = flag_data['interval_start'].replace(':', '-').replace('.', '-')
-            permanent_filename = f"flagged_{timestamp}_score{flag_data['score']}.mp4"
+            source_name = getattr(video_file_path, 'name', video_file_path)
+            extension = os.path.splitext(source_name)[1] or '.mp4'
+            permanent_filename = f"flagged_{timestamp}_score{flag_data['score']}{extension}"
             permanent_path = os.path.join(user_folder, permanent_filename)
             
-            # Move video to permanent location
-            if os.path.exists(video_file_path):
+            # Write an in-memory recording out, or move the video file to its permanent location
+            if hasattr(video_file_path, 'getbuffer'):
+                with open(permanent_path, 'wb') as f:
+                    f.write(video_file_path.getbuffer())
+                print(f"✓ Video saved to: {permanent_path}")
+            elif os.path.exists(video_file_path):
                 os.rename(video_file_path, permanent_path)
                 print(f"✓ Video saved to: {permanent_path}")
             else:
@@ -122,9 +249,11 @@ class ProctoringDatabase:
             flag_data['video_path'] = permanent_path
             flag_data['video_filename'] = permanent_filename
             flag_data['saved_at'] = datetime.now().isoformat()
+            for violation in flag_data.get('violations', ()):
+                stamp_times(violation)
             
-            # Insert into collection
-            result = self.flagged_intervals.insert_one(flag_data)
+            # Insert into collection (the video move above is synchronous, so this stays a single insert)
+            result = self.flagged_intervals.insert_one(flag_data, bypass_document_validation=True)
             
             print(f"✓ Flagged interval saved to MongoDB (ID: {result.inserted_id})")
             
@@ -142,11 +271,10 @@ class ProctoringDatabase:
             video_id: GridFS video ID
             
         Returns:
-            Video data as bytes
+            GridOut file object (supports read(size) and seek) or None
         """
         try:
-            video_file = self.fs.get(video_id)
-            return video_file.read()
+            return self.fs.get(video_id)
         except Exception as e:
             print(f"✗ Error retrieving video: {e}")
             return None
@@ -163,10 +291,10 @@ class ProctoringDatabase:
             True if successful
         """
         try:
-            video_data = self.get_video(video_id)
-            if video_data:
+            video_file = self.get_video(video_id)
+            if video_file:
                 with open(output_path, 'wb') as f:
-                    f.write(video_data)
+                    shutil.copyfileobj(video_file, f, 1024 * 1024)
                 print(f"✓ Video saved to {output_path}")
                 return True
             return False
@@ -213,8 +341,7 @@ class ProctoringDatabase:
             Flagged interval document
         """
         try:
-            from bson.objectid import ObjectId
-            return self.flagged_intervals.find_one({'_id': ObjectId(interval_id)})
+            return self.flagged_intervals.find_one({'_id': to_object_id(interval_id)})
         except Exception as e:
             print(f"✗ Error retrieving interval: {e}")
             return None
@@ -289,10 +416,9 @@ class ProctoringDatabase:
             True if successful
         """
         try:
-            from bson.objectid import ObjectId
             update_data['updated_at'] = datetime.now().isoformat()
             result = self.sessions.update_one(
-                {'_id': ObjectId(session_id)},
+                {'_id': to_object_id(session_id)},
                 {'$set': update_data}
             )
             return result.modified_count > 0
@@ -312,14 +438,13 @@ class ProctoringDatabase:
             True if successful
         """
         try:
-            from bson.objectid import ObjectId
             update_data = {
                 'status': 'completed',
                 'ended_at': datetime.now().isoformat(),
                 'final_report': final_report
             }
             result = self.sessions.update_one(
-                {'_id': ObjectId(session_id)},
+                {'_id': to_object_id(session_id)},
                 {'$set': update_data}
             )
             print(f"✓ Session ended (ID: {session_id})")
@@ -339,22 +464,30 @@ class ProctoringDatabase:
             Statistics dictionary
         """
         try:
-            from bson.objectid import ObjectId
             
             # Get session
-            session = self.sessions.find_one({'_id': ObjectId(session_id)})
+            session = self.sessions.find_one({'_id': to_object_id(session_id)})
             if not session:
                 return None
             
-            # Get all flagged intervals for this session
-            flagged = list(self.flagged_intervals.find({'session_id': str(session_id)}))
+            # Aggregate this session's flagged intervals server-side in one round trip
+            totals = next(self.flagged_intervals.aggregate([
+                {'$match': {'session_id': str(session_id)}},
+                {'$group': {
+                    '_id': None,
+                    'total': {'$sum': 1},
+                    'violations': {'$sum': {'$size': {'$ifNull': ['$violations', []]}}},
+                    'avg_score': {'$avg': {'$ifNull': ['$score', 0]}},
+                    'max_score': {'$max': {'$ifNull': ['$score', 0]}}
+                }}
+            ]), {})
             
             stats = {
                 'session_id': str(session_id),
-                'total_flags': len(flagged),
-                'total_violations': sum(len(f.get('violations', [])) for f in flagged),
-                'average_score': sum(f.get('score', 0) for f in flagged) / len(flagged) if flagged else 0,
-                'max_score': max((f.get('score', 0) for f in flagged), default=0),
+                'total_flags': totals.get('total', 0),
+                'total_violations': totals.get('violations', 0),
+                'average_score': totals.get('avg_score') or 0,
+                'max_score': totals.get('max_score') or 0,
                 'session_status': session.get('status', 'unknown')
             }
             
@@ -396,20 +529,30 @@ class ProctoringDatabase:
             from datetime import timedelta
             cutoff_date = datetime.now() - timedelta(days=days)
             
-            # Find old intervals
-            old_intervals = self.flagged_intervals.find({
-                'saved_at': {'$lt': cutoff_date.isoformat()}
-            })
+            # Find old intervals, fetching only the IDs we need
+            old_intervals = self.flagged_intervals.find(
+                {'saved_at': {'$lt': cutoff_date.isoformat()}},
+                {'_id': 1, 'video_id': 1}
+            )
             
-            deleted_count = 0
+            ids = []
+            video_ids = []
             for interval in old_intervals:
-                # Delete video
+                ids.append(interval['_id'])
                 if 'video_id' in interval:
-                    self.fs.delete(interval['video_id'])
-                
-                # Delete interval record
-                self.flagged_intervals.delete_one({'_id': interval['_id']})
-                deleted_count += 1
+                    video_ids.append(interval['video_id'])
+            
+            if not ids:
+                print("✓ Cleaned up 0 old records")
+                return 0
+            
+            # Delete GridFS videos in bulk (files + their chunks)
+            if video_ids:
+                self.db.fs.files.delete_many({'_id': {'$in': video_ids}})
+                self.db.fs.chunks.delete_many({'files_id': {'$in': video_ids}})
+            
+            # Delete interval records
+            deleted_count = self.flagged_intervals.delete_many({'_id': {'$in': ids}}).deleted_count
             
             print(f"✓ Cleaned up {deleted_count} old records")
             return deleted_count
@@ -419,7 +562,13 @@ class ProctoringDatabase:
             return 0
     
     def close(self):
-        """Close MongoDB connection"""
+        """Stop the flusher, write the remaining buffered violations and close MongoDB connection"""
+        self._flush_stop.set()
+        self._flush_wake.set()
+        # An insert_many in progress on the flusher must finish before the client goes away
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush_violations()
         self.client.close()
         print("✓ MongoDB connection closed")
 
@@ -1,8 +1,96 @@
+import functools
+import os
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import sounddevice as sd
 from collections import deque
+import queue
 import time
 
+# scipy's pocketfft (SIMD kernels, multi-threaded over batches) when available, numpy.fft otherwise
+try:
+    from scipy.fft import rfft, rfftfreq, next_fast_len
+    _FFT_KWARGS = {'workers': -1}
+except ImportError:
+    from numpy.fft import rfft, rfftfreq
+    next_fast_len = None
+    _FFT_KWARGS = {}
+
+
+# pyFFTW plans a codelet for the session's fixed chunk shape once and reuses it (optional)
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+
+# Numba fuses the per-chunk reductions into one compiled pass; NumPy reductions otherwise
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+# int16 PCM full scale -> float [-1, 1) (energy_threshold is expressed in float units)
+_PCM16_SCALE = 1.0 / 32768
+
+
+def _fft_len(n):
+    """Smallest transform length >= n that the FFT backend handles fastest"""
+    return next_fast_len(n, real=True) if next_fast_len else n
+
+
+if njit is not None:
+    # Explicit signature compiles at import (no first-call JIT pause). No on-disk cache:
+    # numba keys it on the module's import name, and a cache left under another name
+    # (e.g. 'audiodetector' vs 'backend.detectors.audiodetector') breaks the import
+    @njit('UniTuple(float64, 3)(complex64[:], float32[:])', fastmath=True)
+    def _spectral_peak(spectrum, freqs):
+        """
+        Magnitude, argmax and sums of one rFFT spectrum in a single pass
+        
+        Returns:
+            tuple: (dominant_freq, sum of magnitudes, frequency-weighted sum of magnitudes)
+        """
+        peak = 0.0
+        peak_idx = 0
+        total = 0.0
+        weighted = 0.0
+        for k in range(spectrum.shape[0]):
+            z = spectrum[k]
+            m = np.sqrt(z.real * z.real + z.imag * z.imag)
+            if m > peak:
+                peak = m
+                peak_idx = k
+            total += m
+            weighted += freqs[k] * m
+        
+        dominant_freq = freqs[peak_idx] if peak > 0 else 0.0
+        return dominant_freq, total, weighted
+    
+    # float32 inputs keep the loads at half width; the scalar accumulators stay float64
+    @njit('UniTuple(float64[:], 3)(float32[:, :], complex64[:, :], float32[:])', fastmath=True)
+    def _chunk_features(frames, spectrum, freqs):
+        """RMS energy, dominant frequency and spectral centroid per chunk in a single loop"""
+        num_chunks, chunk_size = frames.shape
+        energies = np.empty(num_chunks)
+        dominant_freqs = np.empty(num_chunks)
+        centroids = np.empty(num_chunks)
+        
+        for i in range(num_chunks):
+            sum_sq = 0.0
+            for j in range(chunk_size):
+                sum_sq += frames[i, j] * frames[i, j]
+            energies[i] = np.sqrt(sum_sq / chunk_size)
+            
+            # |X|, argmax and both sums fused: the spectrum is read once, magnitudes never stored
+            dominant_freqs[i], total, weighted = _spectral_peak(spectrum[i], freqs)
+            centroids[i] = weighted / total if total > 0 else 0.0
+        
+        return energies, dominant_freqs, centroids
+else:
+    _spectral_peak = _chunk_features = None
+
 class MultiSpeakerDetector:
     def __init__(self, rate=16000, chunk_duration=0.1, energy_threshold=0.01):
         """
@@ -21,20 +109,114 @@ class MultiSpeakerDetector:
         # Track recent frequencies for speaker differentiation
         self.freq_history = deque(maxlen=10)
         
+        # Per-chunk features of the last batch analysis (struct-of-arrays)
+        self._energies = self._dom_freqs = self._centroids = None
+        
+        # Chunk length and sample rate are fixed, so the FFT bin frequencies are too;
+        # float32 like the magnitudes, so the centroid dot product does not promote
+        self._fft_size = _fft_len(self.chunk_size)
+        self._freqs = rfftfreq(self._fft_size, 1.0/self.rate).astype(np.float32)
+        
+        # pyFFTW plans keyed by (rows, n). FFTW_MEASURE planning can take hundreds of ms,
+        # so it is only done here, for the single-chunk transform (analyze_realtime) and
+        # analyze()'s default batch; other shapes get quick FFTW_ESTIMATE plans on first use
+        self._fft_plans = {}
+        self._measured_shapes = ((1, self._fft_size), (10, self._fft_size))
+        if pyfftw is not None:
+            for rows, n in self._measured_shapes:
+                self._fftw_plan(rows, n, effort='FFTW_MEASURE')
+        
+    def _bin_freqs(self, n):
+        """Bin frequencies for an n-point rFFT (cached for the standard chunk size)"""
+        if n == self._fft_size:
+            return self._freqs
+        return rfftfreq(n, 1.0/self.rate).astype(np.float32)
+    
+    def _fftw_plan(self, rows, n, effort='FFTW_ESTIMATE'):
+        """Planned rFFT over aligned (rows, n) float32 buffers, built on first use"""
+        plan = self._fft_plans.get((rows, n))
+        if plan is None:
+            if len(self._fft_plans) >= 8:
+                # Drop the lazily planned shapes, keep the measured ones
+                self._fft_plans = {shape: self._fft_plans[shape] for shape in self._measured_shapes
+                                   if shape in self._fft_plans}
+            fft_in = pyfftw.empty_aligned((rows, n), dtype='float32')
+            fft_out = pyfftw.empty_aligned((rows, n // 2 + 1), dtype='complex64')
+            plan = pyfftw.FFTW(fft_in, fft_out, axes=(1,),
+                               flags=(effort, 'FFTW_DESTROY_INPUT'),
+                               threads=os.cpu_count() or 1)
+            self._fft_plans[(rows, n)] = plan
+        return plan
+    
+    def _spectrum(self, frames, n):
+        """
+        rFFT of each row of frames, zero-padded to n points
+        
+        Args:
+            frames: 2-D array (num_chunks, samples)
+            n: Transform length
+            
+        Returns:
+            numpy.ndarray: (num_chunks, n // 2 + 1) complex64 spectrum (with pyFFTW this is
+            the plan's output buffer, valid until the next transform of the same shape)
+        """
+        if pyfftw is None:
+            # float32 in -> complex64 out with scipy; numpy.fft always returns complex128
+            spectrum = rfft(frames.astype(np.float32, copy=False), n=n, axis=1, **_FFT_KWARGS)
+            return spectrum.astype(np.complex64, copy=False)
+        
+        plan = self._fftw_plan(frames.shape[0], n)
+        # FFTW_DESTROY_INPUT: the input buffer (padding included) is rewritten every call
+        width = frames.shape[1]
+        plan.input_array[:, :width] = frames
+        plan.input_array[:, width:] = 0
+        return plan()
+        
     def get_audio_features(self, audio_data):
-        """Extract features from audio data"""
+        """Extract features from audio data as a dict (single-chunk / realtime API)"""
+        energy, dominant_freq, spectral_centroid = self.get_chunk_features(audio_data)
+        return {
+            'energy': energy,
+            'dominant_freq': dominant_freq,
+            'spectral_centroid': spectral_centroid
+        }
+    
+    def get_chunk_features(self, audio_data):
+        """
+        Extract features from one chunk of audio
+        
+        Args:
+            audio_data: float samples in [-1, 1) or int16 PCM
+            
+        Returns:
+            tuple: (energy, dominant_freq, spectral_centroid)
+        """
+        scale = _PCM16_SCALE if audio_data.dtype == np.int16 else 1.0
         
         # Flatten if stereo
         if len(audio_data.shape) > 1:
             audio_data = audio_data.mean(axis=1)
         
-        # Calculate energy (RMS)
-        energy = np.sqrt(np.mean(audio_data ** 2))
+        # Calculate energy (RMS); int16 uses an exact int64 sum of squares
+        if audio_data.dtype == np.int16:
+            samples = audio_data.astype(np.int64)
+            energy = np.sqrt(np.mean(samples * samples)) * scale
+        else:
+            energy = np.sqrt(np.mean(audio_data ** 2)) * scale
+        
+        # Dominant frequency and centroid are scale-invariant, so int16 goes to the FFT as-is
+        
+        # FFT for frequency analysis (zero-padded to a fast length)
+        n = _fft_len(len(audio_data))
+        spectrum = self._spectrum(audio_data[np.newaxis], n)[0]
+        freqs = self._bin_freqs(n)
         
-        # FFT for frequency analysis
-        fft = np.fft.rfft(audio_data)
-        freqs = np.fft.rfftfreq(len(audio_data), 1/self.rate)
-        magnitudes = np.abs(fft)
+        if _spectral_peak is not None:
+            dominant_freq, total, weighted = _spectral_peak(spectrum, freqs)
+            spectral_centroid = weighted / total if total > 0 else 0
+            return energy, dominant_freq, spectral_centroid
+        
+        magnitudes = np.abs(spectrum)
         
         # Find dominant frequency (fundamental frequency)
         if len(magnitudes) > 0 and np.max(magnitudes) > 0:
@@ -43,17 +225,59 @@ class MultiSpeakerDetector:
         else:
             dominant_freq = 0
         
-        # Calculate spectral centroid
-        if np.sum(magnitudes) > 0:
-            spectral_centroid = np.sum(freqs * magnitudes) / np.sum(magnitudes)
+        # Calculate spectral centroid (dot product: no freqs*magnitudes temporary)
+        total = magnitudes.sum()
+        if total > 0:
+            spectral_centroid = (magnitudes @ freqs) / total
         else:
             spectral_centroid = 0
         
-        return {
-            'energy': energy,
-            'dominant_freq': dominant_freq,
-            'spectral_centroid': spectral_centroid
-        }
+        return energy, dominant_freq, spectral_centroid
+    
+    def get_batch_features(self, frames):
+        """
+        Extract features for many chunks at once with a single batched rFFT
+        
+        Args:
+            frames: 2-D array (num_chunks, chunk_size) of mono samples (float or int16 PCM)
+            
+        Returns:
+            tuple: (energies, dominant_freqs, spectral_centroids), one value per chunk;
+            also kept on the detector as _energies/_dom_freqs/_centroids
+        """
+        # int16 capture is converted once per batch, straight to scaled float32;
+        # the whole feature path then stays float32
+        if frames.dtype == np.int16:
+            frames = np.multiply(frames, np.float32(_PCM16_SCALE), dtype=np.float32)
+        else:
+            frames = frames.astype(np.float32, copy=False)
+        
+        # One FFT call for the whole batch (zero-padded to a fast length)
+        n = _fft_len(frames.shape[1])
+        spectrum = self._spectrum(frames, n)
+        freqs = self._bin_freqs(n)
+        
+        if _chunk_features is not None:
+            self._energies, self._dom_freqs, self._centroids = _chunk_features(
+                np.ascontiguousarray(frames), spectrum, freqs
+            )
+            return self._energies, self._dom_freqs, self._centroids
+        
+        magnitudes = np.abs(spectrum)
+        
+        # Energy (RMS) per chunk
+        energies = np.sqrt(np.mean(frames * frames, axis=1))
+        
+        # Dominant frequency (0 for silent chunks)
+        peaks = magnitudes.max(axis=1)
+        dominant_freqs = np.where(peaks > 0, freqs[np.argmax(magnitudes, axis=1)], 0.0)
+        
+        # Spectral centroid (0 for silent chunks)
+        totals = magnitudes.sum(axis=1)
+        centroids = np.divide(magnitudes @ freqs, totals, out=np.zeros_like(totals), where=totals > 0)
+        
+        self._energies, self._dom_freqs, self._centroids = energies, dominant_freqs, centroids
+        return energies, dominant_freqs, centroids
     
     def detect_multiple_speakers(self, features):
         """
@@ -65,11 +289,24 @@ class MultiSpeakerDetector:
         Returns:
             bool: True if multiple speakers detected
         """
-        if features['energy'] < self.energy_threshold:
+        return self.detect_multiple_speakers_at(features['energy'], features['dominant_freq'])
+    
+    def detect_multiple_speakers_at(self, energy, dominant_freq):
+        """
+        Same as detect_multiple_speakers, taking the feature values directly
+        
+        Args:
+            energy: RMS energy of the chunk
+            dominant_freq: Dominant frequency of the chunk (Hz)
+            
+        Returns:
+            bool: True if multiple speakers detected
+        """
+        if energy < self.energy_threshold:
             return False  # No speech detected
         
         # Add to history
-        self.freq_history.append(features['dominant_freq'])
+        self.freq_history.append(dominant_freq)
         
         if len(self.freq_history) < 5:
             return False  # Not enough data
@@ -82,52 +319,114 @@ class MultiSpeakerDetector:
         # Multiple speakers: std > 80 Hz
         return freq_std > 80
     
-    def analyze(self, duration=30):
+    def detect_multiple_speakers_batch(self, energies, dominant_freqs):
+        """
+        Vectorized detect_multiple_speakers over a sequence of chunks
+        
+        Gives the same per-chunk answers as calling detect_multiple_speakers in order,
+        including the frequency history carried in from (and out to) other calls.
+        
+        Args:
+            energies: RMS energy per chunk
+            dominant_freqs: Dominant frequency per chunk (Hz)
+            
+        Returns:
+            ndarray: bool per chunk, True if multiple speakers detected
+        """
+        window = self.freq_history.maxlen
+        voiced = energies >= self.energy_threshold
+        
+        # Frequency history as the deque would see it: carried values, then this batch's voiced chunks
+        history = np.array(self.freq_history, dtype=np.float64)
+        seq = np.concatenate([history, dominant_freqs[voiced]])
+        
+        # Std of the (up to) 10 most recent frequencies at each position
+        stds = np.zeros(len(seq))
+        if len(seq) >= window:
+            stds[window - 1:] = sliding_window_view(seq, window).std(axis=1)
+        for p in range(min(len(seq), window - 1)):
+            stds[p] = seq[:p + 1].std()
+        filled = np.minimum(np.arange(1, len(seq) + 1), window)
+        multi = (filled >= 5) & (stds > 80)
+        
+        is_multi = np.zeros(len(energies), dtype=bool)
+        is_multi[voiced] = multi[len(history):]
+        
+        self.freq_history.clear()
+        self.freq_history.extend(seq[-window:].tolist())
+        return is_multi
+    
+    def analyze(self, duration=30, batch_chunks=10):
         """
         Analyze audio for multiple speakers
         
+        Chunks are analyzed in batches while recording continues, so the
+        call returns about when the recording ends.
+        
         Args:
             duration: Analysis duration in seconds
+            batch_chunks: Recorded chunks per analysis batch
             
         Returns:
             dict: Analysis results
         """
         print(f"Recording for {duration} seconds...")
         
-        # Record audio
-        audio_data = sd.rec(
-            int(duration * self.rate),
-            samplerate=self.rate,
-            channels=1,
-            dtype='float32'
-        )
-        sd.wait()  # Wait until recording is finished
-        
-        # Process in chunks
         num_chunks = int(duration / self.chunk_duration)
+        # int16 halves the memory of float32; scaled to float per batch
+        audio_data = np.empty((num_chunks, self.chunk_size), dtype=np.int16)
+        ready = queue.Queue()
+        recorded = 0
+        
+        def audio_callback(indata, frames, time_info, status):
+            nonlocal recorded
+            if status:
+                print(f"Status: {status}")
+            # blocksize=chunk_size: each callback fills exactly one chunk row
+            audio_data[recorded] = indata[:, 0]
+            recorded += 1
+            ready.put(recorded)
+            if recorded >= num_chunks:
+                raise sd.CallbackStop
+        
+        # Analyze completed sub-blocks while the rest is still being recorded;
+        # the batched detector carries its history across calls
         multi_speaker_count = 0
         total_speech_frames = 0
+        analyzed = 0
         
-        print("Analyzing audio...")
-        
-        for i in range(num_chunks):
-            start_idx = int(i * self.chunk_size)
-            end_idx = int((i + 1) * self.chunk_size)
-            chunk = audio_data[start_idx:end_idx, 0]
-            
-            # Extract features
-            features = self.get_audio_features(chunk)
+        def analyze_up_to(end):
+            nonlocal multi_speaker_count, total_speech_frames, analyzed
+            energies, dominant_freqs, centroids = self.get_batch_features(audio_data[analyzed:end])
+            is_multi = self.detect_multiple_speakers_batch(energies, dominant_freqs)
+            speech = energies > self.energy_threshold
+            total_speech_frames += int(speech.sum())
+            multi_speaker_count += int((is_multi & speech).sum())
             
-            # Detect multiple speakers
-            is_multi = self.detect_multiple_speakers(features)
+            for i in np.flatnonzero(speech):
+                status = "MULTIPLE" if is_multi[i] else "SINGLE"
+                print(f"Chunk {analyzed+i+1}/{num_chunks} | Energy: {energies[i]:.3f} | "
+                      f"Freq: {dominant_freqs[i]:.1f} Hz | {status}")
+            analyzed = end
+        
+        if num_chunks > 0:
+            with sd.InputStream(callback=audio_callback, channels=1, samplerate=self.rate,
+                                blocksize=self.chunk_size, dtype='int16',
+                                finished_callback=lambda: ready.put(None)):
+                while True:
+                    try:
+                        end = ready.get(timeout=self.chunk_duration + 5)
+                    except queue.Empty:
+                        print("✗ Audio stream stalled, stopping early")
+                        break
+                    if end is None:
+                        break
+                    if end - analyzed >= batch_chunks:
+                        analyze_up_to(end)
             
-            if features['energy'] > self.energy_threshold:
-                total_speech_frames += 1
-                if is_multi:
-                    multi_speaker_count += 1
-                
-                status = "MULTIPLE" if is_multi else "SINGLE"
-                print(f"Chunk {i+1}/{num_chunks} | Energy: {features['energy']:.3f} | Freq: {features['dominant_freq']:.1f} Hz | {status}")
+            # Whatever the stream delivered since the last sub-block
+            if recorded > analyzed:
+                analyze_up_to(recorded)
         
         # Calculate results
         multiple_speaker_ratio = multi_speaker_count / total_speech_frames if total_speech_frames > 0 else 0
@@ -181,7 +480,9 @@ class MultiSpeakerDetector:
         
         print(f"Starting real-time analysis for {duration} seconds...")
         
-        with sd.InputStream(callback=audio_callback, channels=1, samplerate=self.rate):
+        # Fixed blocksize: every callback gets one chunk, so the cached FFT bins always apply
+        with sd.InputStream(callback=audio_callback, channels=1, samplerate=self.rate, blocksize=self.chunk_size,
+                            dtype='int16'):
             sd.sleep(int(duration * 1000))
         
         multiple_speaker_ratio = multi_speaker_count / total_speech_frames if total_speech_frames > 0 else 0
@@ -194,6 +495,11 @@ class MultiSpeakerDetector:
 
 
 # Standalone function version
+@functools.lru_cache(maxsize=4)
+def _get_speaker_detector(energy_threshold):
+    """Shared detector per energy threshold"""
+    return MultiSpeakerDetector(energy_threshold=energy_threshold)
+
 def detect_multiple_speakers_simple(duration=10, energy_threshold=0.01):
     """
     Simple function to detect multiple speakers
@@ -205,7 +511,8 @@ def detect_multiple_speakers_simple(duration=10, energy_threshold=0.01):
     Returns:
         dict: Detection results
     """
-    detector = MultiSpeakerDetector(energy_threshold=energy_threshold)
+    detector = _get_speaker_detector(energy_threshold)
+    detector.freq_history.clear()  # each call is an independent recording
     result = detector.analyze(duration)
     return result
 
@@ -1,18 +1,81 @@
 import cv2
+import functools
+import time
+import types
 import mediapipe as mp
 import numpy as np
 
+try:
+    from mediapipe.tasks import python as mp_tasks
+    from mediapipe.tasks.python import vision as mp_vision
+except ImportError:
+    mp_tasks = None
+
+# Motion-gate thumbnail (width, height): enough to see head movement, cheap to diff
+MOTION_THUMB_SIZE = (80, 60)
+
+class LandmarkerFaceMesh:
+    def __init__(self, model_path, max_num_faces=1, delegate='cpu'):
+        """
+        FaceMesh stand-in backed by the MediaPipe Tasks FaceLandmarker, so a custom
+        (e.g. int8-quantized) .task bundle and a TFLite delegate can be used
+        
+        Args:
+            model_path: FaceLandmarker .task bundle (478 landmarks, iris included)
+            max_num_faces: Maximum number of faces to track
+            delegate: 'cpu' (XNNPACK) or 'gpu'
+        """
+        delegates = {'cpu': mp_tasks.BaseOptions.Delegate.CPU, 'gpu': mp_tasks.BaseOptions.Delegate.GPU}
+        options = mp_vision.FaceLandmarkerOptions(
+            base_options=mp_tasks.BaseOptions(model_asset_path=model_path, delegate=delegates[delegate]),
+            running_mode=mp_vision.RunningMode.VIDEO,
+            num_faces=max_num_faces,
+            min_face_detection_confidence=0.5,
+            min_face_presence_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+        self.landmarker = mp_vision.FaceLandmarker.create_from_options(options)
+        self._last_ts = -1
+    
+    def process(self, rgb_frame):
+        """Same result shape as FaceMesh.process(): multi_face_landmarks[i].landmark"""
+        # VIDEO mode tracks between frames and needs strictly increasing timestamps
+        self._last_ts = max(self._last_ts + 1, time.monotonic_ns() // 1_000_000)
+        image = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(rgb_frame))
+        faces = self.landmarker.detect_for_video(image, self._last_ts).face_landmarks
+        return types.SimpleNamespace(
+            multi_face_landmarks=[types.SimpleNamespace(landmark=face) for face in faces] or None
+        )
+    
+    def close(self):
+        """Release the landmarker"""
+        self.landmarker.close()
+
+
 class GazeFocusDetector:
-    def __init__(self, h_threshold=(0.35, 0.65), v_threshold=(0.35, 0.50)):
+    def __init__(self, h_threshold=(0.35, 0.65), v_threshold=(0.35, 0.50), max_input_size=640,
+                 motion_threshold=2.0, max_num_faces=1, use_opencl=None,
+                 landmarker_model=None, landmarker_delegate='cpu'):
        
-        # Initialize MediaPipe Face Mesh
+        # Initialize MediaPipe Face Mesh; max_num_faces > 1 lets detect_focus() also count
+        # the faces in view (gaze is always measured on the first one).
+        # A FaceLandmarker .task bundle (e.g. int8-quantized) replaces the built-in
+        # FP32 graph when given and the Tasks API is available
         self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
+        self.face_mesh = None
+        if landmarker_model and mp_tasks is not None:
+            try:
+                self.face_mesh = LandmarkerFaceMesh(landmarker_model, max_num_faces, landmarker_delegate)
+                print(f"✓ Gaze landmarks from {landmarker_model} ({landmarker_delegate})")
+            except Exception as e:
+                print(f"✗ Could not load {landmarker_model}, using FaceMesh: {e}")
+        if self.face_mesh is None:
+            self.face_mesh = self.mp_face_mesh.FaceMesh(
+                max_num_faces=max_num_faces,
+                refine_landmarks=True,
+                min_detection_confidence=0.5,
+                min_tracking_confidence=0.5
+            )
         
         # Eye landmark indices
         self.LEFT_EYE = [33, 133]
@@ -24,9 +87,55 @@ class GazeFocusDetector:
         self.LEFT_IRIS = [468, 469, 470, 471, 472]
         self.RIGHT_IRIS = [473, 474, 475, 476, 477]
         
+        # All landmarks the gaze ratios need, gathered in one pass: per eye
+        # [inner/outer corner, corner, top, bottom, 5 iris points] -> shape (2 eyes, 9 points)
+        # (plain ints: indexing the protobuf landmark list with numpy integers is slower)
+        self._GAZE_IDX = tuple(
+            self.LEFT_EYE + [self.LEFT_EYE_TOP, self.LEFT_EYE_BOTTOM] + self.LEFT_IRIS +
+            self.RIGHT_EYE + [self.RIGHT_EYE_TOP, self.RIGHT_EYE_BOTTOM] + self.RIGHT_IRIS
+        )
+        
         # Thresholds
         self.h_min, self.h_max = h_threshold
         self.v_min, self.v_max = v_threshold
+        
+        # Off-center direction indexed by a 4-bit mask
+        # (1: h < h_min, 2: h > h_max, 4: v < 0.35, 8: v > 0.5); horizontal wins, then DOWN
+        self._DIRS = (None, "LEFT", "RIGHT", None,
+                      "UP", "LEFT", "RIGHT", None,
+                      "DOWN", "LEFT", "RIGHT", None,
+                      None, None, None, None)
+        
+        # Frames are downscaled so their long side is at most this before FaceMesh
+        # (its face/iris models run on 128-192 px crops, so larger inputs only cost conversion time)
+        self.max_input_size = max_input_size
+        
+        # Reused resize / RGB buffers so the per-frame preprocessing does not allocate
+        self._small_buf = None
+        self._rgb_buf = None
+        
+        # Large frames are resized and converted through OpenCV's T-API (OpenCL) when a
+        # device is available: one upload, one download of the small RGB frame.
+        # None follows OpenCV's own setting (OPENCV_OPENCL_DEVICE / OPENCV_OPENCL_RUNTIME)
+        self.use_opencl = cv2.ocl.useOpenCL() if use_opencl is None else use_opencl and cv2.ocl.haveOpenCL()
+        
+        # Motion gate: FaceMesh is skipped while the scene matches the last analyzed frame
+        # (mean absolute gray difference on a thumbnail); None or 0 disables it
+        self.motion_threshold = motion_threshold
+        self._prev_gray = None
+        self._last_result = None
+    
+    def _is_static(self, frame):
+        """True if frame barely differs from the last frame FaceMesh ran on"""
+        if not self.motion_threshold:
+            return False
+        gray = cv2.cvtColor(cv2.resize(frame, MOTION_THUMB_SIZE, interpolation=cv2.INTER_AREA),
+                            cv2.COLOR_BGR2GRAY)
+        if (self._prev_gray is not None and self._last_result is not None and
+                cv2.absdiff(gray, self._prev_gray).mean() < self.motion_threshold):
+            return True
+        self._prev_gray = gray
+        return False
     
     def detect_focus(self, frame):
         """
@@ -40,10 +149,26 @@ class GazeFocusDetector:
                 'focused': bool,
                 'h_ratio': float,
                 'v_ratio': float,
-                'face_detected': bool
+                'face_detected': bool,
+                'where': str or None,
+                'num_faces': int (at most max_num_faces)
             }
         """
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self._is_static(frame):
+            return self._last_result
+        self._last_result = self._analyze(frame)
+        return self._last_result
+    
+    def _analyze(self, frame):
+        """Run FaceMesh on a frame and build the detect_focus() result"""
+        # Landmarks are normalized, so downscaling does not change the ratios
+        if self.use_opencl and max(frame.shape[:2]) > self.max_input_size:
+            rgb_frame = self._preprocess_opencl(frame)
+        else:
+            src = self._downscale(frame)
+            if self._rgb_buf is None or self._rgb_buf.shape != src.shape:
+                self._rgb_buf = np.empty_like(src)
+            rgb_frame = cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
         results = self.face_mesh.process(rgb_frame)
         
         if not results.multi_face_landmarks:
@@ -52,14 +177,14 @@ class GazeFocusDetector:
                 'h_ratio': None,
                 'v_ratio': None,
                 'face_detected': False,
-                'where': None
+                'where': None,
+                'num_faces': 0
             }
         
         landmarks = results.multi_face_landmarks[0].landmark
-        h, w = frame.shape[:2]
         
         # Calculate focus
-        focused, h_ratio, v_ratio, where = self._is_looking_straight(landmarks, w, h)
+        focused, h_ratio, v_ratio, where = self._is_looking_straight(landmarks)
         
         
         return {
@@ -67,48 +192,60 @@ class GazeFocusDetector:
             'h_ratio': h_ratio,
             'v_ratio': v_ratio,
             'face_detected': True,
-            'where': where
+            'where': where,
+            'num_faces': len(results.multi_face_landmarks)
         }
     
-    def _is_looking_straight(self, landmarks, w, h):
-        """Internal method to calculate gaze direction"""
+    def _downscale(self, frame):
+        """Shrink a frame (keeping aspect ratio) so its long side is at most max_input_size"""
+        h, w = frame.shape[:2]
+        scale = self.max_input_size / max(h, w)
+        if scale >= 1:
+            return frame
         
-        # Get left eye data
-        left_corners = np.array([[landmarks[i].x * w, landmarks[i].y * h] for i in self.LEFT_EYE])
-        left_top = np.array([landmarks[self.LEFT_EYE_TOP].x * w, landmarks[self.LEFT_EYE_TOP].y * h])
-        left_bottom = np.array([landmarks[self.LEFT_EYE_BOTTOM].x * w, landmarks[self.LEFT_EYE_BOTTOM].y * h])
-        left_iris = np.mean([[landmarks[i].x * w, landmarks[i].y * h] for i in self.LEFT_IRIS], axis=0)
+        size = (round(w * scale), round(h * scale))
+        if self._small_buf is None or self._small_buf.shape[1::-1] != size:
+            self._small_buf = np.empty((size[1], size[0]) + frame.shape[2:], dtype=frame.dtype)
+        return cv2.resize(frame, size, dst=self._small_buf, interpolation=cv2.INTER_AREA)
+    
+    def _preprocess_opencl(self, frame):
+        """Downscale and convert a large BGR frame to RGB on the OpenCL device"""
+        h, w = frame.shape[:2]
+        scale = self.max_input_size / max(h, w)
+        small = cv2.resize(cv2.UMat(frame), (round(w * scale), round(h * scale)),
+                           interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2RGB).get()
+    
+    def _is_looking_straight(self, landmarks):
+        """Internal method to calculate gaze direction"""
         
-        # Get right eye data
-        right_corners = np.array([[landmarks[i].x * w, landmarks[i].y * h] for i in self.RIGHT_EYE])
-        right_top = np.array([landmarks[self.RIGHT_EYE_TOP].x * w, landmarks[self.RIGHT_EYE_TOP].y * h])
-        right_bottom = np.array([landmarks[self.RIGHT_EYE_BOTTOM].x * w, landmarks[self.RIGHT_EYE_BOTTOM].y * h])
-        right_iris = np.mean([[landmarks[i].x * w, landmarks[i].y * h] for i in self.RIGHT_IRIS], axis=0)
+        # Gather the 18 eye/iris landmarks once: (2 eyes, 9 points, xy). Each ratio divides
+        # x by x or y by y, so the normalized coordinates need no scaling to pixels
+        # np.fromiter with a known count fills one flat buffer (no per-point tuples or nested lists)
+        coords = np.fromiter(
+            (v for i in self._GAZE_IDX for v in (landmarks[i].x, landmarks[i].y)),
+            dtype=np.float64, count=2 * len(self._GAZE_IDX)
+        )
+        pts = coords.reshape(2, 9, 2)
+        corners, top, bottom = pts[:, 0:2], pts[:, 2], pts[:, 3]
+        iris = pts[:, 4:].mean(axis=1)
         
-        # Calculate horizontal ratios
-        left_h_ratio = (left_iris[0] - left_corners[0][0]) / (left_corners[1][0] - left_corners[0][0])
-        right_h_ratio = (right_iris[0] - right_corners[0][0]) / (right_corners[1][0] - right_corners[0][0])
-        avg_h_ratio = (left_h_ratio + right_h_ratio) / 2
+        # Calculate horizontal ratios (both eyes at once)
+        h_ratios = (iris[:, 0] - corners[:, 0, 0]) / (corners[:, 1, 0] - corners[:, 0, 0])
+        avg_h_ratio = (h_ratios[0] + h_ratios[1]) / 2
         
         # Calculate vertical ratios
-        left_v_ratio = (left_iris[1] - left_top[1]) / (left_bottom[1] - left_top[1])
-        right_v_ratio = (right_iris[1] - right_top[1]) / (right_bottom[1] - right_top[1])
-        avg_v_ratio = (left_v_ratio + right_v_ratio) / 2
-        where = None
-        # Check if looking straight
-        h_focused = self.h_min < avg_h_ratio < self.h_max
-        v_focused = self.v_min < avg_v_ratio < self.v_max
+        v_ratios = (iris[:, 1] - top[:, 1]) / (bottom[:, 1] - top[:, 1])
+        avg_v_ratio = (v_ratios[0] + v_ratios[1]) / 2
         
-        is_focused = h_focused and v_focused
+        # Check if looking straight
+        is_focused = bool((self.h_min < avg_h_ratio) & (avg_h_ratio < self.h_max) &
+                          (self.v_min < avg_v_ratio) & (avg_v_ratio < self.v_max))
         
-        if avg_h_ratio < self.h_min:
-            where = "LEFT"
-        elif avg_h_ratio > self.h_max:
-            where = "RIGHT"
-        elif avg_v_ratio > 0.5:
-            where = "DOWN"
-        elif avg_v_ratio < 0.35:
-            where = "UP"
+        # Direction from one packed compare instead of an if/elif chain
+        bits = (int(avg_h_ratio < self.h_min) | int(avg_h_ratio > self.h_max) << 1 |
+                int(avg_v_ratio < 0.35) << 2 | int(avg_v_ratio > 0.5) << 3)
+        where = self._DIRS[bits]
         
         return is_focused, avg_h_ratio, avg_v_ratio, where
     
@@ -146,6 +283,11 @@ class GazeFocusDetector:
 
 
 # Standalone function version
+@functools.lru_cache(maxsize=4)
+def _get_gaze_detector(h_threshold, v_threshold):
+    """Shared detector per threshold pair (FaceMesh graph setup takes hundreds of ms); never closed"""
+    return GazeFocusDetector(tuple(h_threshold), tuple(v_threshold))
+
 def detect_gaze_focus(frame, h_threshold=(0.35, 0.65), v_threshold=(0.35, 0.50)):
     """
     Simple function to detect gaze focus
@@ -158,10 +300,7 @@ def detect_gaze_focus(frame, h_threshold=(0.35, 0.65), v_threshold=(0.35, 0.50))
     Returns:
         dict: Focus detection results
     """
-    detector = GazeFocusDetector(h_threshold, v_threshold)
-    result = detector.detect_focus(frame)
-    detector.close()
-    return result
+    return _get_gaze_detector(tuple(h_threshold), tuple(v_threshold)).detect_focus(frame)
 
 
 # Example usage
@@ -2,6 +2,27 @@ import pyperclip
 import time
 from pynput import keyboard
 import threading
+import queue
+
+# OS clipboard change counters (cheap native calls): the clipboard text is only read when they move.
+# Without them (Linux), fall back to reading the text each poll (pyperclip forks xclip/xsel).
+try:
+    from AppKit import NSPasteboard
+except ImportError:
+    NSPasteboard = None
+try:
+    import win32clipboard
+except ImportError:
+    win32clipboard = None
+
+
+def _clipboard_sequence():
+    """Return a function giving the OS clipboard change counter, or None if unavailable"""
+    if NSPasteboard is not None:
+        return NSPasteboard.generalPasteboard().changeCount
+    if win32clipboard is not None:
+        return win32clipboard.GetClipboardSequenceNumber
+    return None
 
 class ScreenActivityMonitor:
     def __init__(self):
@@ -11,77 +32,66 @@ class ScreenActivityMonitor:
         self.tab_switches = 0
         self.copy_paste_events = 0
         
-        # Track keyboard events
-        self.ctrl_pressed = False
-        self.alt_pressed = False
-        self.cmd_pressed = False
-        
-        # Results storage
+        # Results storage (listener threads push onto a SimpleQueue, readers drain it)
         self.events = []
         
         # Keyboard listener
         self.keyboard_listener = None
     
-    def _on_key_press(self, key):
-        """Handle key press events"""
-        try:
-            # Track modifier keys
-            if key == keyboard.Key.ctrl_l or key == keyboard.Key.ctrl_r:
-                self.ctrl_pressed = True
-            elif key == keyboard.Key.alt_l or key == keyboard.Key.alt_r:
-                self.alt_pressed = True
-            elif key == keyboard.Key.cmd:
-                self.cmd_pressed = True
-            
-            # Detect Alt+Tab (Windows/Linux)
-            if self.alt_pressed and key == keyboard.Key.tab:
-                self.tab_switches += 1
-                self._log_event("tab_switch", "Alt+Tab detected")
-            
-            # Detect Cmd+Tab (Mac)
-            if self.cmd_pressed and key == keyboard.Key.tab:
-                self.tab_switches += 1
-                self._log_event("tab_switch", "Cmd+Tab detected")
-            
-            # Detect Ctrl+C (Copy)
-            if self.ctrl_pressed and hasattr(key, 'char') and key.char == 'c':
-                self.copy_paste_events += 1
-                self._log_event("copy", "Ctrl+C detected")
-            
-            # Detect Ctrl+V (Paste)
-            if self.ctrl_pressed and hasattr(key, 'char') and key.char == 'v':
-                self.copy_paste_events += 1
-                self._log_event("paste", "Ctrl+V detected")
-            
-            # Detect Cmd+C (Mac)
-            if self.cmd_pressed and hasattr(key, 'char') and key.char == 'c':
-                self.copy_paste_events += 1
-                self._log_event("copy", "Cmd+C detected")
-            
-            # Detect Cmd+V (Mac)
-            if self.cmd_pressed and hasattr(key, 'char') and key.char == 'v':
-                self.copy_paste_events += 1
-                self._log_event("paste", "Cmd+V detected")
-                
-        except AttributeError:
-            pass
+    def _on_tab_switch(self, combo):
+        """Hotkey callback: Alt+Tab / Cmd+Tab"""
+        self.tab_switches += 1
+        self._log_event("tab_switch", f"{combo} detected")
     
-    def _on_key_release(self, key):
-        """Handle key release events"""
-        try:
-            if key == keyboard.Key.ctrl_l or key == keyboard.Key.ctrl_r:
-                self.ctrl_pressed = False
-            elif key == keyboard.Key.alt_l or key == keyboard.Key.alt_r:
-                self.alt_pressed = False
-            elif key == keyboard.Key.cmd:
-                self.cmd_pressed = False
-        except AttributeError:
-            pass
+    def _on_copy(self, combo):
+        """Hotkey callback: Ctrl+C / Cmd+C"""
+        self.copy_paste_events += 1
+        self._log_event("copy", f"{combo} detected")
+    
+    def _on_paste(self, combo):
+        """Hotkey callback: Ctrl+V / Cmd+V"""
+        self.copy_paste_events += 1
+        self._log_event("paste", f"{combo} detected")
+    
+    def _hotkeys(self):
+        """Key combos to watch; the listener only calls back when one of them is completed"""
+        return {
+            '<alt>+<tab>': lambda: self._on_tab_switch("Alt+Tab"),
+            '<cmd>+<tab>': lambda: self._on_tab_switch("Cmd+Tab"),
+            '<ctrl>+c': lambda: self._on_copy("Ctrl+C"),
+            '<ctrl>+v': lambda: self._on_paste("Ctrl+V"),
+            '<cmd>+c': lambda: self._on_copy("Cmd+C"),
+            '<cmd>+v': lambda: self._on_paste("Cmd+V")
+        }
+    
+    @property
+    def events(self):
+        """Logged events, oldest first (drains the lock-free event queue)"""
+        while True:
+            try:
+                self._events.append(self._event_queue.get_nowait())
+            except queue.Empty:
+                return self._events
+    
+    @events.setter
+    def events(self, value):
+        self._event_queue = queue.SimpleQueue()
+        self._events = value
     
     def _monitor_clipboard(self):
         """Monitor clipboard changes in background"""
+        sequence = _clipboard_sequence()
+        last_sequence = sequence() if sequence else None
+        
         while self.is_monitoring:
             try:
+                if sequence is not None:
+                    current_sequence = sequence()
+                    if current_sequence == last_sequence:
+                        time.sleep(0.5)
+                        continue
+                    last_sequence = current_sequence
+                
                 current_clipboard = pyperclip.paste()
                 if current_clipboard != self.last_clipboard and self.last_clipboard != "":
                     self.copy_paste_events += 1
@@ -98,7 +108,7 @@ class ScreenActivityMonitor:
             'description': description,
             'timestamp': time.time()
         }
-        self.events.append(event)
+        self._event_queue.put(event)
         print(f"[{event_type.upper()}] {description}")
     
     def start_monitoring(self, duration=None):
@@ -128,11 +138,8 @@ class ScreenActivityMonitor:
         clipboard_thread = threading.Thread(target=self._monitor_clipboard, daemon=True)
         clipboard_thread.start()
         
-        # Start keyboard listener
-        self.keyboard_listener = keyboard.Listener(
-            on_press=self._on_key_press,
-            on_release=self._on_key_release
-        )
+        # Start keyboard listener (hotkey matching replaces per-key modifier tracking)
+        self.keyboard_listener = keyboard.GlobalHotKeys(self._hotkeys())
         self.keyboard_listener.start()
         
         # Monitor for specified duration
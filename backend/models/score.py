@@ -1,13 +1,19 @@
 import cv2
 import time
 import threading
+import queue
+import uuid
+from collections import deque
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
 from datetime import datetime
+import numpy as np
 from pymongo import MongoClient
 from gridfs import GridFS
 import io
 import base64
-import sys, os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import os
 
 
 # Import detection modules
@@ -15,11 +21,67 @@ from backend.detectors.gaze_direction import GazeFocusDetector
 from backend.detectors.face_detector import FaceDetector
 from backend.detectors.audiodetector import MultiSpeakerDetector
 from backend.detectors.screen_monitor import ScreenActivityMonitor
-from backend.database.db import ProctoringDatabase
+from backend.database.db import ProctoringDatabase, stamp_times
+from backend.models.video_writer import (
+    MJPEGWriter, SegmentFile, jpeg_size, open_video_writer, recording_name, recording_size,
+    gstreamer_available, gstreamer_capture_pipeline, av
+)
+
+# Seconds past a segment's nominal end before splitmuxsink has closed it
+# (the split waits for the next keyframe)
+SEGMENT_CLOSE_GRACE = 3.0
+
+# Optional FaceLandmarker .task bundle (e.g. an int8-quantized build) for gaze/face
+# checks; None uses MediaPipe's built-in FaceMesh graph
+GAZE_LANDMARKER_MODEL = None
+
+
+def _discard_recording(writer, path):
+    """Finalize an unflagged recording and delete it (runs off the capture thread)"""
+    if writer:
+        writer.release()
+    if isinstance(path, str) and os.path.exists(path):
+        os.remove(path)
+
+
+# Detectors and shared-memory attachments of a detection pool worker process
+_worker = {}
+
+def _init_worker_detectors():
+    """Pool initializer: load the models once per worker process"""
+    _worker['gaze'] = GazeFocusDetector(max_num_faces=2, landmarker_model=GAZE_LANDMARKER_MODEL)
+    _worker['audio'] = MultiSpeakerDetector()
+    _worker['shm'] = {}
+
+def _shared_frame(shm_name, shape, dtype):
+    """View of a frame the parent placed in shared memory (attached once per worker)"""
+    shm = _worker['shm'].get(shm_name)
+    if shm is None:
+        shm = _worker['shm'][shm_name] = SharedMemory(name=shm_name)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _worker_combined(shm_name, shape, dtype):
+    """Fused gaze + face-count detection (one FaceMesh pass) on a shared-memory frame"""
+    return _worker['gaze'].detect_focus(_shared_frame(shm_name, shape, dtype))
+
+def _worker_audio(duration):
+    """Record and analyze audio in the worker process"""
+    return _worker['audio'].analyze(duration)
 
 class ProctoringScoreSystem:
-    def __init__(self):
-        """Initialize Proctoring Score System"""
+    # Severity per violation score (scores above 15 are all 'high')
+    SEVERITY_BY_SCORE = tuple('low' if s < 4 else 'medium' if s < 9 else 'high' for s in range(16))
+    
+    def __init__(self, db=None, load_detectors=True):
+        """
+        Initialize Proctoring Score System
+        
+        Args:
+            db: Shared ProctoringDatabase (e.g. the app's, so violation batches and the
+                connection pool are shared across sessions); None opens a private one
+            load_detectors: False skips loading the gaze/audio/screen detectors, leaving a
+                scorer for precomputed results (score_* methods) only
+        """
         
         # Scoring rules
         self.SCORES = {
@@ -35,17 +97,35 @@ class ProctoringScoreSystem:
         self.FLAG_THRESHOLD = 10
         self.INTERVAL_DURATION = 30 
         
+        # Long side (px) of the frames handed to the detectors; recordings keep full resolution
+        self.DETECTION_SIZE = 320
+        # Do that resize through OpenCV's T-API when an OpenCL device is enabled
+        self.USE_OPENCL = cv2.ocl.useOpenCL()
+        # Most recent violations kept in memory for the report; every violation is
+        # also stored in MongoDB and counted in the breakdown
+        self.VIOLATION_LOG_SIZE = 10000
+        # Reused resize target (only valid until the next detection_frame() call)
+        self._detection_buf = None
+        
         # Initialize detectors
-        self.gaze_detector = GazeFocusDetector()
-        self.face_detector = FaceDetector()
-        self.audio_detector = MultiSpeakerDetector()
-        self.screen_monitor = ScreenActivityMonitor()
-        self.db = ProctoringDatabase()
+        # FaceMesh tracks up to two faces so one pass yields both gaze and face count
+        self.gaze_detector = self.audio_detector = self.screen_monitor = None
+        if load_detectors:
+            self.gaze_detector = GazeFocusDetector(max_num_faces=2, landmarker_model=GAZE_LANDMARKER_MODEL)
+            self.audio_detector = MultiSpeakerDetector()
+            self.screen_monitor = ScreenActivityMonitor()
+        self._face_detector = None
+        # A shared database is owned (and closed) by its creator
+        self._owns_db = db is None
+        self.db = db if db is not None else ProctoringDatabase()
         
         # Overall tracking
         
         self.total_score = 0
-        self.all_violations = []
+        self.total_violations = 0
+        self.all_violations = deque(maxlen=self.VIOLATION_LOG_SIZE)
+        # Per-type counts and scores, kept up to date as violations are recorded
+        self.violation_breakdown = {}
         
         # Interval tracking
         self.interval_start_time = None
@@ -57,31 +137,88 @@ class ProctoringScoreSystem:
         self.video_writer = None
         self.temp_video_file = None
         self.is_recording = False
+        # Set when a flag detached the current GStreamer segment: nothing records again
+        # until the next segment boundary, so further crossings start a new interval
+        self._segment_flagged = False
         self.video_fps = 15
+        # Guards the writer: frames are recorded from request threads while analysis may stop/start it
+        self.video_lock = threading.RLock()
+        
+        # Flagged intervals are finalized and saved by a background writer, so the
+        # capture loop never waits on the file move and MongoDB insert
+        self._flag_queue = queue.Queue()
+        self._flag_writer = threading.Thread(target=self._flag_writer_loop, daemon=True)
+        self._flag_writer.start()
+        
+        # Optional detection process pool (continuous monitoring): frames go through
+        # shared memory and at most one gaze/face check is in flight
+        self._pool = None
+        self._frame_shm = None
+        self._pending_checks = None
+    
+    def _record_violation(self, violation_type, score, details):
+        """Add a violation's score to the session and interval totals, record it once and queue it for the database"""
+        self.total_score += score
+        self.interval_score += score
+        self.total_violations += 1
+        
+        violation = {
+            'type': violation_type,
+            'score': score,
+            'timestamp_ns': time.time_ns(),
+            'details': details
+        }
+        self.all_violations.append(violation)
+        self.interval_violations.append(violation)
+        
+        entry = self.violation_breakdown.get(violation_type)
+        if entry is None:
+            entry = self.violation_breakdown[violation_type] = {'count': 0, 'total_score': 0}
+        entry['count'] += 1
+        entry['total_score'] += score
+        
+        self._save_violation_to_db(violation)
     
     def _save_violation_to_db(self, violation):
-        """Save violation to database immediately"""
+        """Queue violation for a batched database write"""
         if self.session_id:
-            violation_data = {
+            # Separate document: the insert adds _id/saved_at (and formats the timestamp),
+            # which must not leak into the report lists
+            self.db.enqueue_violation({
+                **violation,
                 'session_id': str(self.session_id),
                 'user_id': self.current_user_id,
-                'type': violation['type'],
-                'score': violation['score'],
-                'timestamp': violation['timestamp'],
-                'details': violation.get('details', ''),
                 'description': violation.get('description', violation.get('details', '')),
                 'severity': self._get_severity(violation['score'])
-            }
-            self.db.save_violation(violation_data)
+            })
 
     def _get_severity(self, score):
         """Determine severity based on score"""
-        if score >= 9:
-            return 'high'
-        elif score >= 4:
-            return 'medium'
-        else:
-            return 'low'
+        return self.SEVERITY_BY_SCORE[min(score, 15)]
+    
+    def detection_frame(self, frame):
+        """
+        Downscale a frame for analysis (aspect ratio kept, never upscaled)
+        
+        Args:
+            frame: Full-resolution BGR frame
+            
+        Returns:
+            Frame whose long side is at most DETECTION_SIZE (a reused buffer: consume it
+            before the next call)
+        """
+        h, w = frame.shape[:2]
+        scale = self.DETECTION_SIZE / max(h, w)
+        if scale >= 1:
+            return frame
+        
+        size = (round(w * scale), round(h * scale))
+        if self.USE_OPENCL:
+            # Full frame goes up once; only the small result comes back
+            return cv2.resize(cv2.UMat(frame), size, interpolation=cv2.INTER_AREA).get()
+        if self._detection_buf is None or self._detection_buf.shape != (size[1], size[0]) + frame.shape[2:]:
+            self._detection_buf = np.empty((size[1], size[0]) + frame.shape[2:], dtype=frame.dtype)
+        return cv2.resize(frame, size, dst=self._detection_buf, interpolation=cv2.INTER_AREA)
     
     def _start_new_interval(self):
         """Start a new scoring interval"""
@@ -89,88 +226,181 @@ class ProctoringScoreSystem:
         self.interval_score = 0
         self.interval_violations = []
         
-    def _start_video_recording(self, frame_width, frame_height):
-        """Start recording video for the interval"""
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        self.temp_video_file = f"temp_interval_{int(time.time())}.mp4"
-        self.video_writer = cv2.VideoWriter(
-            self.temp_video_file,
-            fourcc,
-            self.video_fps,
-            (frame_width, frame_height)
-        )
-        self.is_recording = True
-        print(f"📹 Started recording: {self.temp_video_file}")
+    def _start_video_recording(self, frame_width, frame_height, passthrough=False):
+        """
+        Start recording video for the interval
+        
+        Args:
+            frame_width: Frame width in pixels
+            frame_height: Frame height in pixels
+            passthrough: Mux incoming JPEGs into an MJPEG AVI instead of encoding frames
+        """
+        with self.video_lock:
+            if passthrough:
+                # Muxed in memory: discarded intervals (most of them) never touch the disk,
+                # flagged ones are written once by save_flagged_interval
+                self.temp_video_file = io.BytesIO()
+                self.temp_video_file.name = f"temp_interval_{int(time.time())}_{uuid.uuid4().hex[:8]}.avi"
+                self.video_writer = MJPEGWriter(
+                    self.temp_video_file,
+                    self.video_fps,
+                    frame_width,
+                    frame_height
+                )
+            else:
+                # Hardware H.264 when available, software mp4v otherwise
+                self.temp_video_file = f"temp_interval_{int(time.time())}_{uuid.uuid4().hex[:8]}.mp4"
+                self.video_writer = open_video_writer(
+                    self.temp_video_file,
+                    self.video_fps,
+                    frame_width,
+                    frame_height
+                )
+            self.is_recording = True
+        print(f"📹 Started recording: {recording_name(self.temp_video_file)}")
 
     def _stop_video_recording(self):
         """Stop recording and return video file path"""
-        if self.video_writer:
-            self.video_writer.release()
-            self.video_writer = None
-            self.is_recording = False
-            print(f"⏹️  Stopped recording")
-            # Verify file exists before returning
-            if self.temp_video_file and os.path.exists(self.temp_video_file):
-                file_size = os.path.getsize(self.temp_video_file)
-                print(f"✓ Video file ready: {file_size} bytes")
-                return self.temp_video_file
-            else:
-                print(f"✗ Video file not created: {self.temp_video_file}")
-                return None
+        with self.video_lock:
+            if self.video_writer:
+                self.video_writer.release()
+                self.video_writer = None
+                self.is_recording = False
+                print(f"⏹️  Stopped recording")
+                # Verify the recording exists before returning
+                file_size = recording_size(self.temp_video_file)
+                if file_size:
+                    print(f"✓ Video file ready: {file_size} bytes")
+                    return self.temp_video_file
+                else:
+                    print(f"✗ Video file not created: {recording_name(self.temp_video_file)}")
+                    return None
         
         print(f"✗ No video writer active")
         return None
+    
+    def _detach_video_recording(self):
+        """
+        Hand off the active writer without finalizing it, so a new recording can start immediately
         
-    def _check_and_flag_interval(self, force=False):
+        Returns:
+            tuple: (writer, file_path) to be released by the caller, or (None, None)
+        """
+        with self.video_lock:
+            writer, path = self.video_writer, self.temp_video_file
+            self.video_writer = None
+            self.temp_video_file = None
+            self.is_recording = False
+        return writer, path
+    
+    def record_jpeg(self, jpeg_bytes):
         """
-        Check if interval should be evaluated and potentially flagged
+        Append an already-encoded JPEG to the interval recording without decoding it
         
-        Args:
-            force: Force check regardless of time (for manual triggers)
+        Returns:
+            bool: False if passthrough recording is unavailable (no PyAV or unreadable header)
+        """
+        if av is None:
+            return False
+        with self.video_lock:
+            if not self.video_writer:
+                size = jpeg_size(jpeg_bytes)
+                if size is None:
+                    return False
+                self._start_video_recording(*size, passthrough=True)
+            if isinstance(self.video_writer, MJPEGWriter):
+                try:
+                    self.video_writer.write_jpeg(jpeg_bytes)
+                    return True
+                except Exception as e:
+                    print(f"✗ Error muxing JPEG frame: {e}")
+        return False
+    
+    def record_frame(self, frame):
+        """Write a decoded BGR frame to the interval recording, starting one if needed"""
+        with self.video_lock:
+            if self.video_writer:
+                self.video_writer.write(frame)
+            elif not self.is_recording:
+                h, w = frame.shape[:2]
+                self._start_video_recording(w, h)
+        
+    def _flag_interval(self):
+        """
+        Flag the current interval (callers check interval_score >= FLAG_THRESHOLD first):
+        hand its recording to the flag writer and start a new interval
+        
+        Returns:
+            bool: True if the interval was flagged
         """
         if self.interval_start_time is None:
             self._start_new_interval()
-            return
-        
-        # Check if threshold exceeded (immediate flag)
-        if self.interval_score >= self.FLAG_THRESHOLD:
-            if not self.is_recording:
-                print(f"✗ No active recording to flag")
-                return False
-            video_file = self._stop_video_recording()
-            time.sleep(1)
-            
-            if not video_file or not os.path.exists(video_file):
-                print(f"✗ Video file missing: {video_file}")
+            return False
+        if not self.is_recording:
+            if self._segment_flagged:
+                # This GStreamer segment was already flagged and is not re-attached until
+                # the next boundary: start over instead of retrying on every violation
+                print(f"✗ Segment already flagged, starting a new interval")
                 self._start_new_interval()
                 return False
-            print(f"✓ Video file exists: {video_file} ({os.path.getsize(video_file)} bytes)")
-            
-            # Save video to DB
-            flag_data = {
-                'interval_start': datetime.fromtimestamp(self.interval_start_time).isoformat(),
-                'interval_end': datetime.now().isoformat(),
-                'score': self.interval_score,
-                'violations': self.interval_violations.copy(),
-                'flagged_at': datetime.now().isoformat()
-            }
+            # Keep the score: the interval is flagged once its recording has started
+            print(f"✗ No active recording to flag")
+            return False
+        writer, video_file = self._detach_video_recording()
+        self._segment_flagged = isinstance(writer, SegmentFile)
+        
+        # Integer times, formatted by stamp_times() when the flag is saved or reported
+        now_ns = time.time_ns()
+        flag_data = {
+            'interval_start_ns': int(self.interval_start_time * 1e9),
+            'interval_end_ns': now_ns,
+            'score': self.interval_score,
+            # No copy: _start_new_interval() below gives the next interval a fresh list
+            'violations': self.interval_violations,
+            'flagged_at_ns': now_ns
+        }
+        
+        if self.session_id:
+            flag_data['session_id'] = str(self.session_id)
+            flag_data['user_id'] = self.current_user_id
+        
+        # Finalize and save in the background; the next interval starts right away.
+        # The writer gets its own copies: saving adds fields to the document and formats
+        # the violations' timestamps, while generate_report() may be reading self.flags
+        saved = {**flag_data, 'violations': [dict(violation) for violation in flag_data['violations']]}
+        self._flag_queue.put((writer, video_file, saved))
+        
+        self.flags.append(flag_data)
+        print(f"\n🚨 IMMEDIATE FLAG! Interval Score: {self.interval_score} (Threshold: {self.FLAG_THRESHOLD})")
+        self._start_new_interval()
+        return True
+    
+    def _flag_writer_loop(self):
+        """Background writer: finalize flagged recordings and save them to MongoDB (None stops it)"""
+        while True:
+            item = self._flag_queue.get()
+            if item is None:
+                break
             
-            # Save to MongoDB with video - THIS MOVES THE FILE
-            if video_file and self.session_id and os.path.exists(video_file):  # ADD os.path.exists check
-                flag_data['session_id'] = str(self.session_id)
-                flag_data['user_id'] = self.current_user_id 
-                self.db.save_flagged_interval(flag_data, video_file)  # This moves the file
-                print(f"✓ Video saved via database method")
-            elif video_file:
-                print(f"✗ Video file not found: {video_file}")
+            writer, video_file, flag_data = item
+            try:
+                if writer:
+                    writer.release()
+                    print(f"⏹️  Stopped recording")
                 
-            
-            self.flags.append(flag_data)
-            print(f"\n🚨 IMMEDIATE FLAG! Interval Score: {self.interval_score} (Threshold: {self.FLAG_THRESHOLD})")
-            self._start_new_interval()
-            return True
-        
-        return False
+                file_size = recording_size(video_file)
+                if not file_size:
+                    print(f"✗ Video file missing: {recording_name(video_file)}")
+                    continue
+                print(f"✓ Video file exists: {recording_name(video_file)} ({file_size} bytes)")
+                
+                # Save to MongoDB with video - THIS MOVES (or writes out) THE FILE
+                if 'session_id' in flag_data:
+                    self.db.save_flagged_interval(flag_data, video_file)
+                    print(f"✓ Video saved via database method")
+            except Exception as e:
+                print(f"✗ Error saving flagged interval: {e}")
+    
     def analyze_gaze(self, frame):
         """
         Analyze gaze direction
@@ -178,27 +408,27 @@ class ProctoringScoreSystem:
         Returns:
             dict: Gaze analysis with score
         """
-        result = self.gaze_detector.detect_focus(frame)
+        return self.score_gaze(self.gaze_detector.detect_focus(frame))
+    
+    def score_gaze(self, result):
+        """
+        Score a gaze detection result
         
+        Args:
+            result: Output of GazeFocusDetector.detect_focus()
+            
+        Returns:
+            dict: Gaze analysis with score
+        """
         score = 0
         if result['face_detected'] and not result['focused']:
             score = self.SCORES['gaze_distracted']
-            self.total_score += score
-            self.interval_score += score
             
-            violation = {
-                'type': 'gaze_distracted',
-                'score': score,
-                'timestamp': datetime.now().isoformat(),
-                'details': f"Looking {result['where']}" if result['where'] else "focused away",
-                
-            }
-            self.all_violations.append(violation)
-            self.interval_violations.append(violation)
-            self._save_violation_to_db(violation) 
+            self._record_violation('gaze_distracted', score, f"Looking {result['where']}" if result['where'] else "focused away")
             
             # Check for immediate flag
-            self._check_and_flag_interval()
+            if self.interval_score >= self.FLAG_THRESHOLD:
+                self._flag_interval()
             
         return {
             'focused': result['focused'],
@@ -207,6 +437,40 @@ class ProctoringScoreSystem:
             'interval_score': self.interval_score
         }
     
+    @property
+    def face_detector(self):
+        """YOLO person detector, loaded on first use (checks normally use analyze_combined)"""
+        if self._face_detector is None:
+            self._face_detector = FaceDetector()
+        return self._face_detector
+    
+    def analyze_combined(self, frame):
+        """
+        Gaze and face-count analysis from a single FaceMesh pass (no separate face model)
+        
+        Returns:
+            tuple: (gaze analysis, face analysis) as returned by analyze_gaze / analyze_faces
+        """
+        return self.score_combined(self.gaze_detector.detect_focus(frame))
+    
+    def score_combined(self, result):
+        """
+        Score a detect_focus() result for both gaze and face count
+        
+        Args:
+            result: Output of GazeFocusDetector.detect_focus() (with 'num_faces')
+            
+        Returns:
+            tuple: (gaze analysis, face analysis) with scores
+        """
+        num_faces = result['num_faces']
+        faces = {
+            'num_faces': num_faces,
+            'multiple_faces': num_faces > 1,
+            'no_face': num_faces == 0
+        }
+        return self.score_gaze(result), self.score_faces(faces)
+    
     def analyze_faces(self, frame):
         """
         Analyze number of faces
@@ -214,41 +478,33 @@ class ProctoringScoreSystem:
         Returns:
             dict: Face analysis with score
         """
-        result = self.face_detector.detect_faces(frame)
+        return self.score_faces(self.face_detector.detect_faces(frame))
+    
+    def score_faces(self, result):
+        """
+        Score a face detection result
         
+        Args:
+            result: Output of FaceDetector.detect_faces()
+            
+        Returns:
+            dict: Face analysis with score
+        """
         score = 0
         if result['multiple_faces']:
             score = self.SCORES['multiple_faces']
-            self.total_score += score
-            self.interval_score += score
-            violation = {
-                'type': 'multiple_faces',
-                'score': score,
-                'timestamp': datetime.now().isoformat(),
-                'details': f"{result['num_faces']} faces detected"
-            }
-            self.all_violations.append(violation)
-            self.interval_violations.append(violation)
-            self._save_violation_to_db(violation) 
+            self._record_violation('multiple_faces', score, f"{result['num_faces']} faces detected")
             
             
         if result['no_face']:
             score = self.SCORES['no_face']
-            self.total_score += score
-            self.interval_score += score
-            violation = {
-                'type': 'no_face',
-                'score': score,
-                'timestamp': datetime.now().isoformat(),
-                'details': "No face detected"
-            }
-            self.all_violations.append(violation)
-            self.interval_violations.append(violation)
-            self._save_violation_to_db(violation) 
+            self._record_violation('no_face', score, "No face detected")
             
             
-        # Check for immediate flag
-        self._check_and_flag_interval()
+        # Check for immediate flag on every frame (not only when this frame scored), so an
+        # interval that crossed the threshold before recording started is flagged once it has one
+        if self.interval_score >= self.FLAG_THRESHOLD:
+            self._flag_interval()
         
         return {
             'num_faces': result['num_faces'],
@@ -265,45 +521,36 @@ class ProctoringScoreSystem:
         Returns:
             dict: Audio analysis with score
         """
-        result = self.audio_detector.analyze(duration)
+        return self.score_audio(self.audio_detector.analyze(duration))
+    
+    def score_audio(self, result):
+        """
+        Score an audio analysis result
         
+        Args:
+            result: Output of MultiSpeakerDetector.analyze()
+            
+        Returns:
+            dict: Audio analysis with score
+        """
         score = 0
         if result['total_speech_frames'] > 0:
             # Speech detected
             speech_score = self.SCORES['speech_detected']
             score += speech_score
             
-            violation = {
-                'type': 'speech_detected',
-                'score': speech_score,
-                'timestamp': datetime.now().isoformat(),
-                'details': "Single voice detected"
-            }
-            self.all_violations.append(violation)
-            self.interval_violations.append(violation)
-            self._save_violation_to_db(violation)
+            self._record_violation('speech_detected', speech_score, "Single voice detected")
             
             if result['multiple_speakers_detected']:
                 # Multiple voices
                 multi_score = self.SCORES['multiple_voices']
                 score += multi_score
                 
-                violation = {
-                    'type': 'multiple_voices',
-                    'score': multi_score,
-                    'timestamp': datetime.now().isoformat(),
-                    'details': f"Confidence: {result['confidence']:.2%}"
-                }
-                self.all_violations.append(violation)
-                self.interval_violations.append(violation)
-                self._save_violation_to_db(violation)
-        
-        self.total_score += score
-        self.interval_score += score
+                self._record_violation('multiple_voices', multi_score, f"Confidence: {result['confidence']:.2%}")
         
         # Check for immediate flag
-        if score > 0:
-            self._check_and_flag_interval()
+        if score and self.interval_score >= self.FLAG_THRESHOLD:
+            self._flag_interval()
         
         return {
             'speech_detected': result['total_speech_frames'] > 0,
@@ -334,37 +581,18 @@ class ProctoringScoreSystem:
             tab_score = result['tab_switches'] * self.SCORES['tab_switch']
             score += tab_score
             
-            violation = {
-                'type': 'tab_switch',
-                'score': tab_score,
-                'timestamp': datetime.now().isoformat(),
-                'details': f"{result['tab_switches']} tab switches"
-            }
-            self.all_violations.append(violation)
-            self.interval_violations.append(violation)
-            self._save_violation_to_db(violation)
+            self._record_violation('tab_switch', tab_score, f"{result['tab_switches']} tab switches")
         
         # Score copy/paste events
         if result['copy_paste_events'] > 0:
             cp_score = result['copy_paste_events'] * self.SCORES['copy_paste']
             score += cp_score
             
-            violation = {
-                'type': 'copy_paste',
-                'score': cp_score,
-                'timestamp': datetime.now().isoformat(),
-                'details': f"{result['copy_paste_events']} copy/paste events"
-            }
-            self.all_violations.append(violation)
-            self.interval_violations.append(violation)
-            self._save_violation_to_db(violation)
-        
-        self.total_score += score
-        self.interval_score += score
+            self._record_violation('copy_paste', cp_score, f"{result['copy_paste_events']} copy/paste events")
         
         # Check for immediate flag
-        if score > 0:
-            self._check_and_flag_interval()
+        if score and self.interval_score >= self.FLAG_THRESHOLD:
+            self._flag_interval()
         
         return {
             'tab_switches': result['tab_switches'],
@@ -373,13 +601,145 @@ class ProctoringScoreSystem:
             'interval_score': self.interval_score
         }
     
-    def run_continuous_monitoring(self, check_interval=10, user_id='user_001', exam_id='exam_001'):
+    def _start_detection_pool(self, workers=3):
+        """Start worker processes for fused gaze/face and audio detection (spawned, so no threads are forked)"""
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker_detectors,
+                                         mp_context=multiprocessing.get_context('spawn'))
+        print(f"✓ Detection pool started ({workers} workers)")
+    
+    def _stop_detection_pool(self):
+        """Score the in-flight check, stop the workers and free the shared frame"""
+        if self._pool is None:
+            return
+        self._collect_checks(wait=True)
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+        if self._frame_shm is not None:
+            self._frame_shm.close()
+            self._frame_shm.unlink()
+            self._frame_shm = None
+    
+    def _check_frame(self, frame, check_count):
+        """Run the gaze and face checks on one captured frame (in the pool when it is running)"""
+        # Detectors get a downscaled copy; the recording keeps the full frame
+        small = self.detection_frame(frame)
+        
+        if self._pool is None:
+            self._log_checks(check_count, *self.analyze_combined(small))
+            return
+        
+        # The shared frame is still being read by the previous check: skip this one
+        if self._pending_checks is not None:
+            return
+        
+        if self._frame_shm is None or self._frame_shm.size < small.nbytes:
+            if self._frame_shm is not None:
+                self._frame_shm.close()
+                self._frame_shm.unlink()
+            self._frame_shm = SharedMemory(create=True, size=small.nbytes)
+        np.ndarray(small.shape, dtype=small.dtype, buffer=self._frame_shm.buf)[:] = small
+        
+        args = (self._frame_shm.name, small.shape, small.dtype.str)
+        self._pending_checks = (check_count, self._pool.submit(_worker_combined, *args))
+    
+    def _collect_checks(self, wait=False):
+        """Score the in-flight pool check once its result is ready (or wait for it)"""
+        if self._pending_checks is None:
+            return
+        check_count, future = self._pending_checks
+        if not wait and not future.done():
+            return
+        self._pending_checks = None
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"✗ Detection worker failed: {e}")
+            return
+        self._log_checks(check_count, *self.score_combined(result))
+    
+    def _log_checks(self, check_count, gaze_result, face_result):
+        """Print one check's scored gaze and face results"""
+        print(f"[{check_count}] Gaze: {'✓ Focused' if gaze_result['focused'] else '✗ Distracted'} | +{gaze_result['score']} | Interval: {gaze_result['interval_score']}")
+        print(f"[{check_count}] Faces: {face_result['num_faces']} | +{face_result['score']} | Interval: {face_result['interval_score']}")
+    
+    def _open_gstreamer_capture(self, check_interval, stopped, device='/dev/video0'):
+        """
+        Open a camera pipeline that records interval segments itself and hands
+        Python only one frame per check_interval
+        
+        Args:
+            check_interval: Seconds between detection samples
+            stopped: threading.Event set when capture shuts down
+            device: V4L2 camera device
+            
+        Returns:
+            tuple: (cv2.VideoCapture, segment file pattern) or (None, None) if unavailable
+        """
+        if not gstreamer_available():
+            return None, None
+        
+        location = f"temp_interval_{int(time.time())}_{uuid.uuid4().hex[:8]}_%05d.mp4"
+        pipeline = gstreamer_capture_pipeline(device, check_interval, self.INTERVAL_DURATION, location)
+        if pipeline is None:
+            return None, None
+        
+        cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+        if not cap.isOpened():
+            print("✗ GStreamer capture failed, recording from Python instead")
+            cap.release()
+            return None, None
+        
+        self._segments_started = time.time()
+        print(f"📹 Recording through GStreamer: {location}")
+        return cap, location
+    
+    def _gstreamer_monitoring_loop(self, cap, location, stopped):
+        """
+        Detection loop over GStreamer samples; the pipeline writes one segment per interval
+        
+        Args:
+            cap: Capture opened by _open_gstreamer_capture
+            location: Segment file pattern
+            stopped: threading.Event set when capture shuts down
+        """
+        check_count = 0
+        segment = -1
+        
+        while True:
+            ret, frame = cap.read()  # Blocks until the next detection sample
+            if not ret:
+                break
+            
+            # A new segment began: it becomes the recording of a fresh interval
+            current = int((time.time() - self._segments_started) // self.INTERVAL_DURATION)
+            if current != segment:
+                if self.is_recording:
+                    print(f"\n✓ Interval completed. Score: {self.interval_score} (Clear)\n")
+                    writer, path = self._detach_video_recording()
+                    threading.Thread(target=_discard_recording, args=(writer, path), daemon=True).start()
+                
+                segment = current
+                closes_at = self._segments_started + (segment + 1) * self.INTERVAL_DURATION + SEGMENT_CLOSE_GRACE
+                with self.video_lock:
+                    self.temp_video_file = location % segment
+                    self.video_writer = SegmentFile(self.temp_video_file, closes_at, stopped)
+                    self.is_recording = True
+                    self._segment_flagged = False
+                self._start_new_interval()
+            
+            self._collect_checks(wait=True)
+            self._check_frame(frame, check_count)
+            check_count += 1
+    
+    def run_continuous_monitoring(self, check_interval=10, user_id='user_001', exam_id='exam_001',
+                                  use_process_pool=True):
         """
         Run continuous monitoring for specified duration
         
         Args:
             duration: Total monitoring time in seconds
             check_interval: Seconds between checks
+            use_process_pool: Run detection in worker processes so it never holds the capture loop's GIL
             
         Returns:
             dict: Complete monitoring report
@@ -402,65 +762,84 @@ class ProctoringScoreSystem:
         # Start screen monitoring in background
         self.screen_monitor.start_monitoring()
         
+        if use_process_pool:
+            self._start_detection_pool()
+        
         audio_running = True
         def audio_monitor_loop():
             while audio_running:
-                audio_result = self.analyze_audio(duration=5)
+                if self._pool is None:
+                    audio_result = self.analyze_audio(duration=5)
+                else:
+                    # The worker records and analyzes; this thread just waits on the result
+                    try:
+                        audio_result = self.score_audio(self._pool.submit(_worker_audio, 5).result())
+                    except Exception as e:
+                        print(f"✗ Audio worker stopped: {e}")
+                        break
                 print(f"[AUDIO] Speech: {audio_result['speech_detected']} | Multiple: {audio_result['multiple_speakers']} | +{audio_result['score']} | Interval: {audio_result['interval_score']}")
                 time.sleep(5)  # Check audio every 5 seconds
 
         audio_thread = threading.Thread(target=audio_monitor_loop, daemon=True)
         audio_thread.start()
         
-        # Open webcam
-        cap = cv2.VideoCapture(0)
+        # Capture and record inside a GStreamer pipeline when OpenCV supports it,
+        # otherwise read every frame in Python and record it here
+        capture_stopped = threading.Event()
+        cap, segment_location = self._open_gstreamer_capture(check_interval, capture_stopped)
+        if cap is None:
+            cap = cv2.VideoCapture(0)
+            # Capture at the recording rate and let read() block until the driver has a
+            # frame, instead of polling with sleeps (no duplicated or dropped frames)
+            cap.set(cv2.CAP_PROP_FPS, self.video_fps)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
         frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
         check_count = 0
         
         try:
-            last_check_time = time.time()
+            if segment_location is not None:
+                self._gstreamer_monitoring_loop(cap, segment_location, capture_stopped)
+            else:
+                last_check_time = time.time()
             
-            while True:
-                ret, frame = cap.read()
+                while True:
+                    ret, frame = cap.read()
                 
-                if ret:
-                    # Start recording if not already recording
-                    if not self.is_recording:
-                        self._start_video_recording(frame_width, frame_height)
+                    # Score a pool check as soon as its results are in
+                    self._collect_checks()
                     
-                    # Write EVERY frame to video (no delay)
-                    if self.video_writer:
-                        self.video_writer.write(frame)
+                    if ret:
+                        # Start recording if not already recording
+                        if not self.is_recording:
+                            self._start_video_recording(frame_width, frame_height)
                     
-                    # Only run detection checks every check_interval seconds
-                    current_time = time.time()
-                    if current_time - last_check_time >= check_interval:
-                        # Check gaze
-                        gaze_result = self.analyze_gaze(frame)
-                        print(f"[{check_count}] Gaze: {'✓ Focused' if gaze_result['focused'] else '✗ Distracted'} | +{gaze_result['score']} | Interval: {gaze_result['interval_score']}")
-                        
-                        # Check faces
-                        face_result = self.analyze_faces(frame)
-                        print(f"[{check_count}] Faces: {face_result['num_faces']} | +{face_result['score']} | Interval: {face_result['interval_score']}")
-                        
-                        check_count += 1
-                        last_check_time = current_time
-                
-                # Check if 30-second interval completed
-                elapsed = time.time() - self.interval_start_time
-                if elapsed >= self.INTERVAL_DURATION:
-                    if self.interval_score < self.FLAG_THRESHOLD:
-                        print(f"\n✓ Interval completed. Score: {self.interval_score} (Clear)\n")
-                        # Stop and discard video (not flagged)
-                        video_file = self._stop_video_recording()
-                        if video_file and os.path.exists(video_file):
-                            os.remove(video_file)
-                    self._start_new_interval()
+                        # Write EVERY frame to video (no delay)
+                        if self.video_writer:
+                            self.video_writer.write(frame)
+                    
+                        # Only run detection checks every check_interval seconds
+                        current_time = time.time()
+                        if current_time - last_check_time >= check_interval:
+                            self._check_frame(frame, check_count)
+                            check_count += 1
+                            last_check_time = current_time
                 
-                # Small delay to prevent CPU overload (but still captures ~30fps)
-                time.sleep(0.03)  # ~30 FPS
+                    # Check if 30-second interval completed
+                    elapsed = time.time() - self.interval_start_time
+                    if elapsed >= self.INTERVAL_DURATION:
+                        if self.interval_score < self.FLAG_THRESHOLD:
+                            print(f"\n✓ Interval completed. Score: {self.interval_score} (Clear)\n")
+                            # Stop and discard video (not flagged)
+                            video_file = self._stop_video_recording()
+                            if video_file and os.path.exists(video_file):
+                                os.remove(video_file)
+                        self._start_new_interval()
+                    
+                    # read() returns at once when the camera fails: back off instead of spinning
+                    if not ret:
+                        time.sleep(0.1)
                 
         except KeyboardInterrupt:
             print("\n\nMonitoring stopped by user")
@@ -468,6 +847,8 @@ class ProctoringScoreSystem:
         finally:
             
             audio_running = False  # Stop audio thread
+            capture_stopped.set()
+            self._stop_detection_pool()
             time.sleep(1)
             if self.video_writer:
                 self.video_writer.release()
@@ -484,8 +865,9 @@ class ProctoringScoreSystem:
             report = self.generate_report()
             if self.session_id:
                 self.db.end_session(self.session_id, report)
-            # Force final interval check
-            self._check_and_flag_interval(force=True)
+            # Final interval check
+            if self.interval_score >= self.FLAG_THRESHOLD:
+                self._flag_interval()
             return report
         
     
@@ -538,36 +920,39 @@ class ProctoringScoreSystem:
         Returns:
             dict: Complete report with scores and violations
         """
+        # Violations and flags carry integer times until they are reported or stored;
+        # format copies so the scorer's (and the flag writer's) dicts are left alone
+        violations = [stamp_times(dict(violation)) for violation in self.all_violations]
+        flags = [
+            stamp_times({**flag, 'violations': [stamp_times(dict(v)) for v in flag['violations']]})
+            for flag in self.flags
+        ]
+        
         report = {
             'total_score': self.total_score,
-            'total_violations': len(self.all_violations),
-            'violations': self.all_violations,
+            'total_violations': self.total_violations,
+            'violations': violations,
             'violation_breakdown': self._get_violation_breakdown(),
             'interval_duration': self.INTERVAL_DURATION,
             'flag_threshold': self.FLAG_THRESHOLD,
-            'flagged_intervals': self.flags,
-            'num_flagged_intervals': len(self.flags),
-            'overall_status': 'FLAGGED' if len(self.flags) > 0 else 'CLEAR',
+            'flagged_intervals': flags,
+            'num_flagged_intervals': len(flags),
+            'overall_status': 'FLAGGED' if len(flags) > 0 else 'CLEAR',
             'timestamp': datetime.now().isoformat()
         }
         
         return report
     
     def _get_violation_breakdown(self):
-        """Get breakdown of violations by type"""
-        breakdown = {}
-        for violation in self.all_violations:
-            vtype = violation['type']
-            if vtype not in breakdown:
-                breakdown[vtype] = {'count': 0, 'total_score': 0}
-            breakdown[vtype]['count'] += 1
-            breakdown[vtype]['total_score'] += violation['score']
-        return breakdown
+        """Get breakdown of violations by type (a copy of the running tally)"""
+        return {vtype: dict(entry) for vtype, entry in self.violation_breakdown.items()}
     
     def reset_score(self):
         """Reset all scores and violations"""
         self.total_score = 0
-        self.all_violations = []
+        self.total_violations = 0
+        self.all_violations.clear()
+        self.violation_breakdown = {}
         self.interval_score = 0
         self.interval_violations = []
         self.interval_start_time = None
@@ -577,23 +962,29 @@ class ProctoringScoreSystem:
     def close(self):
         """Close all detectors and release resources"""
         # Stop screen monitoring first (stops background threads)
-        if self.screen_monitor.is_monitoring:
+        if self.screen_monitor is not None and self.screen_monitor.is_monitoring:
             self.screen_monitor.stop_monitoring()
         
         # Release video writer
-        if self.video_writer:
-            self.video_writer.release()
-            self.video_writer = None
+        with self.video_lock:
+            if self.video_writer:
+                self.video_writer.release()
+                self.video_writer = None
         
         # Close detectors
-        self.gaze_detector.close()
+        if self.gaze_detector is not None:
+            self.gaze_detector.close()
         
-        # IMPORTANT: Close database LAST after all background operations stopped
-        # Wait a moment to ensure any pending database operations complete
-        import time
-        time.sleep(0.5)
+        # Let the background writer save any queued flagged intervals
+        self._flag_queue.put(None)
+        self._flag_writer.join()
         
-        self.db.close()
+        # IMPORTANT: Close database LAST after all background operations stopped;
+        # a shared database only gets this session's buffered violations written out
+        if self._owns_db:
+            self.db.close()
+        else:
+            self.db.flush_violations()
         print("All detectors closed")
 
 
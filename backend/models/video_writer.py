@@ -0,0 +1,296 @@
+import cv2
+import functools
+import os
+import re
+import shutil
+import subprocess
+import time
+from fractions import Fraction
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# Hardware H.264 encoders tried for the ffmpeg pipe, with their extra arguments
+# (VAAPI needs frames uploaded to a render node)
+HW_ENCODERS = (
+    ('h264_nvenc', ['-preset', 'p1']),
+    ('h264_qsv', ['-preset', 'veryfast']),
+    ('h264_vaapi', ['-vaapi_device', '/dev/dri/renderD128', '-vf', 'format=nv12,hwupload']),
+)
+
+# GStreamer H.264 encoder elements tried for in-pipeline recording, with a keyframe
+# interval property ({gop} frames) so segments split close to the interval boundary
+GST_H264_ENCODERS = (
+    ('vaapih264enc', 'keyframe-period={gop}'),
+    ('nvh264enc', 'gop-size={gop}'),
+    ('qsvh264enc', 'gop-size={gop}'),
+    ('x264enc', 'tune=zerolatency speed-preset=ultrafast key-int-max={gop}'),
+)
+
+# SOFn markers carrying the frame size (C4/C8/CC are DHT/JPG/DAC, not frame headers)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(data):
+    """
+    Read the frame size from a JPEG header without decoding it
+
+    Args:
+        data: Encoded JPEG bytes (bytes, bytearray or memoryview)
+
+    Returns:
+        tuple: (width, height) or None if no frame header is found
+    """
+    data = memoryview(data)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in _SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        if marker == 0xD9 or marker == 0xDA:
+            return None
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    return None
+
+
+def recording_name(recording):
+    """Display name of a recording: a file path or an in-memory buffer's name"""
+    return getattr(recording, 'name', recording)
+
+
+def recording_size(recording):
+    """
+    Size of a finished recording in bytes
+    
+    Args:
+        recording: File path or in-memory buffer (io.BytesIO)
+        
+    Returns:
+        int: Size in bytes, or None if there is no such recording
+    """
+    if recording is None:
+        return None
+    if hasattr(recording, 'getbuffer'):
+        return recording.getbuffer().nbytes
+    return os.path.getsize(recording) if os.path.exists(recording) else None
+
+
+class MJPEGWriter:
+    def __init__(self, path, fps, frame_width, frame_height):
+        """
+        Write JPEG frames into an MJPEG AVI container without re-encoding
+
+        Args:
+            path: Output file path or seekable file object (e.g. io.BytesIO)
+            fps: Frame rate
+            frame_width: Frame width in pixels
+            frame_height: Frame height in pixels
+        """
+        self.container = av.open(path, mode='w', format='avi')
+        self.stream = self.container.add_stream('mjpeg', rate=fps)
+        self.stream.width = frame_width
+        self.stream.height = frame_height
+        self.stream.pix_fmt = 'yuvj420p'
+        self.stream.codec_context.options = {}
+        self.time_base = Fraction(1, fps)
+        self.frame_index = 0
+
+    def write_jpeg(self, jpeg_bytes):
+        """Mux an already-encoded JPEG as the next frame"""
+        packet = av.Packet(jpeg_bytes)
+        packet.stream = self.stream
+        packet.pts = packet.dts = self.frame_index
+        packet.time_base = self.time_base
+        packet.is_keyframe = True
+        self.container.mux(packet)
+        self.frame_index += 1
+
+    def write(self, frame):
+        """Encode a BGR frame to JPEG and mux it (for frames without a JPEG source)"""
+        ok, buffer = cv2.imencode('.jpg', frame)
+        if ok:
+            self.write_jpeg(buffer.tobytes())
+
+    def release(self):
+        """Write the trailer and close the file"""
+        self.container.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _ffmpeg_encoder_works(encoder):
+    """Probe once whether ffmpeg can actually open a hardware encoder on this machine"""
+    if shutil.which('ffmpeg') is None:
+        return False
+    extra = dict(HW_ENCODERS).get(encoder, [])
+    try:
+        probe = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+             '-i', 'color=black:s=256x256:d=0.2', *extra, '-c:v', encoder, '-f', 'null', '-'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10
+        )
+        return probe.returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+class FFmpegPipeWriter:
+    def __init__(self, path, fps, frame_width, frame_height, encoder, encoder_args=()):
+        """
+        Encode BGR frames by piping them to an ffmpeg subprocess (hardware H.264)
+        
+        Args:
+            path: Output file path
+            fps: Frame rate
+            frame_width: Frame width in pixels
+            frame_height: Frame height in pixels
+            encoder: ffmpeg video encoder name (e.g. 'h264_nvenc')
+            encoder_args: Extra ffmpeg arguments for the encoder
+        """
+        self.frame_size = (frame_width, frame_height)
+        self.process = subprocess.Popen(
+            ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+             '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{frame_width}x{frame_height}',
+             '-r', str(fps), '-i', '-', *encoder_args, '-c:v', encoder, path],
+            stdin=subprocess.PIPE
+        )
+    
+    def isOpened(self):
+        """Match cv2.VideoWriter: True while ffmpeg accepts frames"""
+        return self.process.poll() is None
+    
+    def write(self, frame):
+        """Send one BGR frame to the encoder (frames of another size are dropped, like cv2.VideoWriter)"""
+        if (frame.shape[1], frame.shape[0]) != self.frame_size or self.process.stdin.closed:
+            return
+        try:
+            self.process.stdin.write(frame.data if frame.flags.c_contiguous else frame.tobytes())
+        except (BrokenPipeError, ValueError):
+            print("✗ ffmpeg encoder exited, dropping frames")
+            self.process.stdin.close()
+    
+    def release(self):
+        """Close the pipe and wait for ffmpeg to finish the file"""
+        if not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+        self.process.wait()
+
+
+class SegmentFile:
+    def __init__(self, path, closes_at, stopped):
+        """
+        Writer stand-in for a segment that a GStreamer splitmuxsink is recording
+        
+        Args:
+            path: Segment file path
+            closes_at: time.time() by which the muxer has finalized the segment
+            stopped: threading.Event set when the capture pipeline shuts down
+        """
+        self.path = path
+        self.closes_at = closes_at
+        self.stopped = stopped
+    
+    def write(self, frame):
+        """Frames are recorded by the pipeline itself"""
+    
+    def release(self):
+        """Block until the muxer has closed the segment (or capture has stopped)"""
+        self.stopped.wait(max(0.0, self.closes_at - time.time()))
+
+
+def gstreamer_available():
+    """True if OpenCV was built with the GStreamer video I/O backend"""
+    return re.search(r'GStreamer:\s*YES', cv2.getBuildInformation()) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _gst_element_exists(name):
+    """Check once whether a GStreamer element is installed"""
+    if shutil.which('gst-inspect-1.0') is None:
+        return False
+    try:
+        probe = subprocess.run(['gst-inspect-1.0', '--exists', name],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+        return probe.returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+def gstreamer_capture_pipeline(device, sample_interval, segment_seconds, location, camera_fps=30):
+    """
+    Build a camera pipeline that encodes and records in GStreamer and only hands
+    sparse BGR samples to an OpenCV appsink
+    
+    Args:
+        device: V4L2 device path
+        sample_interval: Seconds between frames delivered to OpenCV
+        segment_seconds: Length of each recorded segment
+        location: splitmuxsink file pattern (printf-style, e.g. 'seg_%05d.mp4')
+        camera_fps: Expected camera frame rate (sets the keyframe interval)
+        
+    Returns:
+        str: Pipeline description, or None if no H.264 encoder element is installed
+    """
+    encoder = next(((name, props) for name, props in GST_H264_ENCODERS if _gst_element_exists(name)), None)
+    if encoder is None:
+        return None
+    name, props = encoder
+    
+    # Keyframe every second, so a segment overshoots its boundary by at most that
+    sample_rate = 1 / Fraction(sample_interval).limit_denominator(1000)
+    return (
+        f"v4l2src device={device} ! videoconvert ! tee name=t "
+        f"t. ! queue ! videoconvert ! {name} {props.format(gop=camera_fps)} ! h264parse ! "
+        f"splitmuxsink location={location} max-size-time={int(segment_seconds * 1e9)} "
+        f"t. ! queue leaky=downstream max-size-buffers=1 ! videorate drop-only=true ! "
+        f"video/x-raw,framerate={sample_rate.numerator}/{sample_rate.denominator} ! "
+        f"videoconvert ! video/x-raw,format=BGR ! appsink drop=true max-buffers=1 sync=false"
+    )
+
+
+def open_video_writer(path, fps, frame_width, frame_height):
+    """
+    Open the cheapest available H.264 writer for BGR frames
+    
+    Tries OpenCV's FFmpeg backend with hardware acceleration, then an ffmpeg
+    subprocess with a hardware encoder, then OpenCV's software mp4v encoder.
+    
+    Args:
+        path: Output .mp4 path
+        fps: Frame rate
+        frame_width: Frame width in pixels
+        frame_height: Frame height in pixels
+        
+    Returns:
+        Writer with write(frame) and release()
+    """
+    size = (frame_width, frame_height)
+    
+    if hasattr(cv2, 'VIDEOWRITER_PROP_HW_ACCELERATION'):
+        writer = cv2.VideoWriter(path, cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*'avc1'), fps, size,
+                                 [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        if writer.isOpened():
+            return writer
+        writer.release()
+    
+    for encoder, args in HW_ENCODERS:
+        if _ffmpeg_encoder_works(encoder):
+            writer = FFmpegPipeWriter(path, fps, frame_width, frame_height, encoder, args)
+            if writer.isOpened():
+                return writer
+    
+    return cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import {
   Eye, User, Mic, Monitor, AlertCircle, CheckCircle,
@@ -6,7 +6,7 @@ import {
 } from 'lucide-react';
 import { apiService } from '../services/api';
 import { useToast } from '../hooks/useToast';
-import type { SessionDetails, MonitoringUpdate, Violation } from '../types';
+import type { SessionDetails, MonitoringUpdate, MonitoringUpdateMessage, Violation } from '../types';
 import { Spinner } from '../components/Spinner';
 
 export function SessionMonitoring() {
@@ -16,6 +16,8 @@ export function SessionMonitoring() {
   const [allViolations, setAllViolations] = useState<Violation[]>([]);
   const [sessionDetails, setSessionDetails] = useState<SessionDetails | null>(null);
   const [monitoringData, setMonitoringData] = useState<MonitoringUpdate | null>(null);
+  const [frameUrl, setFrameUrl] = useState<string | null>(null);
+  const frameUrlRef = useRef<string | null>(null);
   const [loading, setLoading] = useState(true);
   const [connected, setConnected] = useState(false);
 
@@ -52,8 +54,15 @@ export function SessionMonitoring() {
       setConnected(false);
     });
 
-    const handleMonitoringUpdate = (data: MonitoringUpdate) => {
+    const handleMonitoringUpdate = ({ meta: data, frame }: MonitoringUpdateMessage) => {
       if (data.session_id === sessionId) {
+        if (frame) {
+          // Binary JPEG attachment -> object URL; revoke the previous one so frames don't leak
+          const url = URL.createObjectURL(new Blob([frame], { type: 'image/jpeg' }));
+          if (frameUrlRef.current) URL.revokeObjectURL(frameUrlRef.current);
+          frameUrlRef.current = url;
+          setFrameUrl(url);
+        }
         setMonitoringData(data);
         setSessionDetails(prev => prev ? {
           ...prev,
@@ -70,6 +79,10 @@ export function SessionMonitoring() {
 
     return () => {
       apiService.offMonitoringUpdate(handleMonitoringUpdate);
+      if (frameUrlRef.current) {
+        URL.revokeObjectURL(frameUrlRef.current);
+        frameUrlRef.current = null;
+      }
     };
   }, [sessionId, navigate, showToast]);
 
@@ -159,8 +172,8 @@ export function SessionMonitoring() {
           <div className="space-y-6">
             <div className="bg-white rounded-xl shadow-sm border border-slate-200 overflow-hidden">
               <div className="relative bg-black aspect-video flex items-center justify-center">
-                {monitoringData?.frame ? (
-                  <img src={monitoringData.frame} alt="Live feed" className="w-full h-full object-contain" />
+                {frameUrl ? (
+                  <img src={frameUrl} alt="Live feed" className="w-full h-full object-contain" />
                 ) : (
                   <div className="text-white text-center">
                     <Video className="w-16 h-16 mx-auto mb-4 opacity-50" />
@@ -110,10 +110,13 @@ export function StudentSession() {
 
         ctx?.drawImage(videoRef.current, 0, 0);
 
-        const frameData = canvas.toDataURL('image/jpeg', 0.7);
+        const frameBlob = await new Promise<Blob | null>(resolve =>
+          canvas.toBlob(resolve, 'image/jpeg', 0.7)
+        );
+        if (!frameBlob) return;
 
         try {
-          await apiService.sendFrame(sessionId, frameData, screenActivity);
+          await apiService.sendFrame(sessionId, frameBlob, screenActivity);
         } catch (error) {
           console.error('Failed to send frame:', error);
         }
@@ -1,5 +1,5 @@
 import { io, Socket } from 'socket.io-client';
-import type { Session, SessionStats, SessionDetails, FlaggedInterval, MonitoringUpdate } from '../types';
+import type { Session, SessionStats, SessionDetails, FlaggedInterval, MonitoringUpdateMessage } from '../types';
 
 const API_BASE_URL = 'http://localhost:8000';
 
@@ -36,21 +36,23 @@ class APIService {
     }
   }
 
-  async sendFrame(sessionId: string, frameData: string, screenActivity?: {
+  async sendFrame(sessionId: string, frame: Blob, screenActivity?: {
     tabSwitches: number;
     copyPasteEvents: number;
     windowBlurred: boolean;
   }): Promise<void> {
-    const response = await fetch(`${API_BASE_URL}/api/session/${sessionId}/frame`, {
+    const headers: Record<string, string> = {
+      'Content-Type': 'image/jpeg',
+    };
+    if (screenActivity) {
+      headers['X-Tab-Switches'] = String(screenActivity.tabSwitches);
+      headers['X-Copy-Paste-Events'] = String(screenActivity.copyPasteEvents);
+    }
+
+    const response = await fetch(`${API_BASE_URL}/api/session/${sessionId}/frame_raw`, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        session_id: sessionId,
-        frame: frameData,
-        screen_activity: screenActivity,
-      }),
+      headers,
+      body: frame,
     });
 
     if (!response.ok) {
@@ -151,13 +153,13 @@ getVideoUrl(videoPath: string): string {
     }
   }
 
-  onMonitoringUpdate(callback: (data: MonitoringUpdate) => void): void {
+  onMonitoringUpdate(callback: (data: MonitoringUpdateMessage) => void): void {
     if (this.socket) {
       this.socket.on('monitoring_update', callback);
     }
   }
 
-  offMonitoringUpdate(callback: (data: MonitoringUpdate) => void): void {
+  offMonitoringUpdate(callback: (data: MonitoringUpdateMessage) => void): void {
     if (this.socket) {
       this.socket.off('monitoring_update', callback);
     }
@@ -47,7 +47,6 @@ export interface ScreenActivity {
 export interface MonitoringUpdate {
   session_id: string;
   user_id: string;
-  frame?: string;
   gaze: {
     status: string;
     horizontal_ratio: number;
@@ -72,6 +71,12 @@ export interface MonitoringUpdate {
   timestamp: string;
 }
 
+// Socket payload: JSON metadata plus the JPEG frame as a binary attachment
+export interface MonitoringUpdateMessage {
+  meta: MonitoringUpdate;
+  frame?: ArrayBuffer;
+}
+
 export interface FlaggedInterval {
   interval_id: string;
   session_id: string;
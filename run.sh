@@ -1,3 +1,3 @@
 #!/bin/bash
 source venv/bin/activate
-python backend/app.py
+python -m backend.app
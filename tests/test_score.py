@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+score = pytest.importorskip("backend.models.score")
+from backend.models.video_writer import SegmentFile
+
+
+DISTRACTED = {'focused': False, 'face_detected': True, 'where': 'LEFT', 'num_faces': 1}
+TWO_FACES = {'num_faces': 2, 'multiple_faces': True, 'no_face': False}
+ONE_FACE = {'num_faces': 1, 'multiple_faces': False, 'no_face': False}
+
+
+class FakeDatabase:
+    """Stands in for the shared ProctoringDatabase (no session id, so nothing is written)"""
+
+    def flush_violations(self):
+        return 0
+
+
+class FakeWriter:
+    """Interval recording stand-in for the web path"""
+
+    def write(self, frame):
+        pass
+
+    def release(self):
+        pass
+
+
+@pytest.fixture
+def scorer():
+    scorer = score.ProctoringScoreSystem(db=FakeDatabase(), load_detectors=False)
+    scorer._start_new_interval()
+    yield scorer
+    scorer.close()
+
+
+def _attach(scorer, writer, path):
+    """Make writer the active interval recording"""
+    with scorer.video_lock:
+        scorer.video_writer = writer
+        scorer.temp_video_file = path
+        scorer.is_recording = True
+
+
+def _attach_segment(scorer, path):
+    """What _gstreamer_monitoring_loop does at a segment boundary"""
+    _attach(scorer, SegmentFile(path, time.time(), threading.Event()), path)
+    scorer._segment_flagged = False
+    scorer._start_new_interval()
+
+
+def test_second_crossing_in_one_gstreamer_segment_starts_a_new_interval(scorer):
+    scorer.FLAG_THRESHOLD = 4
+    _attach_segment(scorer, 'seg_00000.mp4')
+
+    # First crossing flags the interval and hands the segment to the flag writer
+    scorer.score_gaze(DISTRACTED)
+    scorer.score_gaze(DISTRACTED)
+    assert len(scorer.flags) == 1
+    assert not scorer.is_recording
+    assert scorer.interval_score == 0
+
+    # Second crossing in the same segment: nothing to flag, the interval starts over
+    scorer.score_gaze(DISTRACTED)
+    scorer.score_gaze(DISTRACTED)
+    assert len(scorer.flags) == 1
+    assert scorer.interval_score == 0
+
+    # Later violations accumulate from zero again instead of retrying every time
+    scorer.score_gaze(DISTRACTED)
+    assert scorer.interval_score == 2
+    assert scorer.total_violations == 5
+
+    # The next segment is recorded and can be flagged as usual
+    _attach_segment(scorer, 'seg_00001.mp4')
+    scorer.score_gaze(DISTRACTED)
+    scorer.score_gaze(DISTRACTED)
+    assert len(scorer.flags) == 2
+
+
+def test_crossing_before_recording_starts_is_flagged_on_the_next_frame(scorer):
+    # Web path: the first frame is scored before record_frame() opens the writer
+    scorer.score_faces(TWO_FACES)
+    assert scorer.interval_score == scorer.FLAG_THRESHOLD
+    assert scorer.flags == []
+
+    # Once the interval has a recording, the next frame flags it with the kept score
+    _attach(scorer, FakeWriter(), 'interval.mp4')
+    scorer.score_faces(ONE_FACE)
+    assert len(scorer.flags) == 1
+    assert scorer.flags[0]['score'] == scorer.FLAG_THRESHOLD
+    assert scorer.interval_score == 0